@@ -43,6 +43,11 @@ class Cart(TimeStampedModel):
         """Calculate total price (can include delivery charges later)"""
         return self.subtotal
     
+    @property
+    def hold_key(self):
+        """Identifies this cart's stock holds"""
+        return f"cart:{self.pk}"
+    
     def clear(self):
         """Clear all items from cart"""
         self.items.all().delete()
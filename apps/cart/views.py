@@ -168,19 +168,15 @@ class WishlistView(LoginRequiredMixin, ListView):
     login_url = '/accounts/login/'
 
     def get_queryset(self):
+        # Each item carries the `user_price` for this user's price tier
+        price_field = Product.price_field_for_user(self.request.user)
         return (
             Wishlist.objects
             .filter(user=self.request.user)
             .select_related('product', 'product__manufacturer')
+            .annotate(user_price=F(f'product__{price_field}'))
         )
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        # Attach a `user_price` attribute to each wishlist item
-        for item in context['wishlist_items']:
-            item.user_price = item.product.get_price_for_user(self.request.user)
-        return context
-
 @login_required
 @require_POST
 def add_to_wishlist(request):
@@ -6,7 +6,6 @@ app_name = 'orders'
 urlpatterns = [
     # Order management
     path('', views.OrderListView.as_view(), name='order_list'),
-    path('<str:order_number>/', views.OrderDetailView.as_view(), name='order_detail'),
     
     # Checkout
     path('checkout/', views.checkout_view, name='checkout'),
@@ -20,4 +19,7 @@ urlpatterns = [
     
     # Public tracking
     path('track/<str:order_number>/', views.order_tracking, name='order_tracking'),
+    
+    # Last: it would otherwise swallow checkout/, apply-coupon/ and remove-coupon/
+    path('<str:order_number>/', views.OrderDetailView.as_view(), name='order_detail'),
 ]
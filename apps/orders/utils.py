@@ -3,6 +3,7 @@ from decimal import Decimal
 from django.utils import timezone
 from django.db import transaction
 from apps.core.models import DeliveryZone
+from apps.products.inventory import allocate_stock
 from .models import Order, OrderItem, OrderStatusHistory, CouponUsage
 
 def calculate_delivery_charge(subtotal, pincode=None):
@@ -96,7 +97,8 @@ def create_order_from_cart(cart, user, form_data):
     )
     
     # Create order items
-    for cart_item in cart.items.all():
+    cart_items = list(cart.items.select_related('product'))
+    for cart_item in cart_items:
         OrderItem.objects.create(
             order=order,
             product=cart_item.product,
@@ -104,11 +106,15 @@ def create_order_from_cart(cart, user, form_data):
             price=cart_item.price,
             total_price=cart_item.total_price
         )
-        
-        # Update stock
-        if cart_item.product.track_inventory:
-            cart_item.product.stock_quantity -= cart_item.quantity
-            cart_item.product.save()
+    
+    # Ship from the soonest-expiring lots, using the cart's checkout holds;
+    # fails the whole order if short
+    allocate_stock(
+        [(cart_item.product, cart_item.quantity) for cart_item in cart_items],
+        reference=order.order_number,
+        notes=f'Order #{order.order_number}',
+        hold_key=cart.hold_key
+    )
     
     # Create initial status history
     OrderStatusHistory.objects.create(
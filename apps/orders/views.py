@@ -7,13 +7,13 @@ from django.contrib import messages
 from django.views.generic import ListView, DetailView, CreateView
 from django.views.decorators.http import require_POST
 from django.http import JsonResponse
-from django.db import transaction
 from django.utils import timezone
 from django.core.paginator import Paginator
 
 from apps.cart.models import Cart
 from apps.cart.utils import get_or_create_cart
 from apps.accounts.models import Address
+from apps.products.inventory import InsufficientStock, hold_stock, release_stock, stock_transaction
 from .models import Order, OrderItem, OrderStatusHistory, Coupon, CouponUsage
 from .forms import CheckoutForm, CouponForm
 from .utils import calculate_delivery_charge, create_order_from_cart
@@ -65,7 +65,7 @@ def checkout_view(request):
         form = CheckoutForm(request.POST, user=request.user)
         if form.is_valid():
             try:
-                with transaction.atomic():
+                with stock_transaction():
                     # Create order
                     order = create_order_from_cart(
                         cart=cart,
@@ -79,10 +79,27 @@ def checkout_view(request):
                     messages.success(request, f'Order #{order.order_number} placed successfully!')
                     return redirect('orders:order_detail', order_number=order.order_number)
             
+            except InsufficientStock as e:
+                for product, requested, available in e.shortages:
+                    messages.error(
+                        request,
+                        f'{product.name}: only {available} available, {requested} in your cart'
+                    )
             except Exception as e:
                 messages.error(request, 'Error placing order. Please try again.')
                 
     else:
+        # Set the cart's stock aside while the form is filled in
+        shortages = hold_stock(
+            [(item.product, item.quantity) for item in cart.items.select_related('product')],
+            key=cart.hold_key
+        )
+        for product, requested, available in shortages:
+            messages.warning(
+                request,
+                f'{product.name}: only {available} available, {requested} in your cart'
+            )
+        
         initial_data = {}
         if addresses.filter(is_default=True).exists():
             default_address = addresses.filter(is_default=True).first()
@@ -90,10 +107,12 @@ def checkout_view(request):
         
         form = CheckoutForm(initial=initial_data, user=request.user)
     
+    cart_items = cart.items.select_related('product', 'product__manufacturer').all()
     context = {
         'form': form,
         'cart': cart,
-        'cart_items': cart.items.select_related('product', 'product__manufacturer').all(),
+        'cart_items': cart_items,
+        'prescription_required': any(item.product.prescription_required == 'RX' for item in cart_items),
         'addresses': addresses,
         'subtotal': subtotal,
         'delivery_charge': delivery_charge,
@@ -199,10 +218,16 @@ def cancel_order(request, order_number):
         })
     
     try:
-        with transaction.atomic():
-            # Update order status
-            order.status = 'CANCELLED'
-            order.save()
+        with stock_transaction():
+            # Conditional, so a repeated request cannot restore stock twice
+            cancelled = Order.objects.filter(
+                pk=order.pk, status__in=['PENDING', 'CONFIRMED']
+            ).exclude(payment_status='PAID').update(status='CANCELLED', updated_at=timezone.now())
+            if not cancelled:
+                return JsonResponse({
+                    'success': False,
+                    'message': 'This order cannot be cancelled'
+                })
             
             # Add status history
             OrderStatusHistory.objects.create(
@@ -212,11 +237,12 @@ def cancel_order(request, order_number):
                 changed_by=request.user
             )
             
-            # Restore stock
-            for item in order.items.all():
-                if item.product.track_inventory:
-                    item.product.stock_quantity += item.quantity
-                    item.product.save()
+            # Restore stock to the lots it shipped from
+            release_stock(
+                [(item.product, item.quantity) for item in order.items.select_related('product')],
+                reference=order.order_number,
+                notes=f'Order #{order.order_number} cancelled'
+            )
         
         return JsonResponse({
             'success': True,
@@ -1,8 +1,12 @@
-import base64
 from django import forms
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.urls import path
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import Category, Manufacturer, Product, ProductImage, ProductReview, Stock, ProductTag
+from . import reports
+from .models import Category, Manufacturer, Product, ProductImage, ProductReview, Stock, StockLot, ProductTag
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -18,6 +22,7 @@ class CategoryAdmin(admin.ModelAdmin):
     def product_count(self, obj):
         return obj.product_count
     product_count.short_description = 'Products'
+    product_count.admin_order_field = 'product_count'
 
 @admin.register(Manufacturer)
 class ManufacturerAdmin(admin.ModelAdmin):
@@ -30,13 +35,14 @@ class ManufacturerAdmin(admin.ModelAdmin):
     def product_count(self, obj):
         return obj.product_count
     product_count.short_description = 'Products'
+    product_count.admin_order_field = 'product_count'
 
 class ProductImageAdminForm(forms.ModelForm):
     # this virtual field will show up as a file‐upload
     image_file = forms.ImageField(
         label="Upload Image",
         required=False,
-        help_text="Choose an image file and we'll store it as base64 for you."
+        help_text="Choose an image file; it is stored once per distinct content."
     )
 
     class Meta:
@@ -48,11 +54,7 @@ class ProductImageAdminForm(forms.ModelForm):
         instance = super().save(commit=False)
         image = self.cleaned_data.get("image_file")
         if image:
-            data = image.read()
-            b64 = base64.b64encode(data).decode("utf-8")
-            instance.image_data = b64
-            # if you want a thumbnail, you could generate/update thumbnail_data here too
-            instance.thumbnail_data = b64
+            instance.set_image(image.read())
         if commit:
             instance.save()
         return instance
@@ -67,8 +69,40 @@ class ProductImageInline(admin.TabularInline):
 class StockInline(admin.TabularInline):
     model = Stock
     extra = 0
-    fields = ['movement_type', 'quantity', 'batch_number', 'expiry_date', 'notes']
-    readonly_fields = ['created_at']
+    fields = ['movement_type', 'quantity', 'batch_number', 'expiry_date', 'notes', 'balance_after']
+    readonly_fields = ['created_at', 'balance_after']
+
+class StockLotInline(admin.TabularInline):
+    model = StockLot
+    extra = 0
+    fields = ['batch_number', 'expiry_date', 'quantity']
+    readonly_fields = ['batch_number', 'expiry_date', 'quantity']
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        # Lots are fed by stock movements
+        return False
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).filter(quantity__gt=0)
+
+class StockLevelFilter(admin.SimpleListFilter):
+    title = 'stock level'
+    parameter_name = 'stock_level'
+    
+    def lookups(self, request, model_admin):
+        return [
+            ('low', 'Low stock'),
+            ('out', 'Out of stock'),
+        ]
+    
+    def queryset(self, request, queryset):
+        # Both go through the partial index behind low_stock()
+        if self.value() == 'low':
+            return queryset.low_stock()
+        if self.value() == 'out':
+            return queryset.low_stock().filter(stock_quantity=0)
+        return queryset
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
@@ -77,13 +111,13 @@ class ProductAdmin(admin.ModelAdmin):
         'stock_quantity', 'is_active', 'is_featured'
     ]
     list_filter = [
-        'is_active', 'is_featured', 'prescription_required', 
+        'is_active', 'is_featured', 'prescription_required', StockLevelFilter,
         'category', 'manufacturer', 'created_at'
     ]
     search_fields = ['name', 'description', 'manufacturer__name']
     prepopulated_fields = {'slug': ('name', 'manufacturer')}
     list_editable = ['is_active', 'is_featured']
-    readonly_fields = ['view_count', 'created_at', 'updated_at']
+    readonly_fields = ['view_count', 'rating_avg', 'rating_count', 'created_at', 'updated_at']
     
     fieldsets = (
         ('Basic Information', {
@@ -106,12 +140,12 @@ class ProductAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('Statistics', {
-            'fields': ('view_count', 'created_at', 'updated_at'),
+            'fields': ('view_count', 'rating_avg', 'rating_count', 'created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
     
-    inlines = [ProductImageInline, StockInline]
+    inlines = [ProductImageInline, StockLotInline, StockInline]
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('category', 'manufacturer')
@@ -131,12 +165,48 @@ class ProductReviewAdmin(admin.ModelAdmin):
 class StockAdmin(admin.ModelAdmin):
     list_display = ['product', 'movement_type', 'quantity', 'batch_number', 'expiry_date', 'created_at']
     list_filter = ['movement_type', 'created_at', 'expiry_date']
-    search_fields = ['product__name', 'batch_number', 'supplier']
+    search_fields = ['product__name', 'batch_number', 'supplier', 'reference']
     readonly_fields = ['created_at']
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('product', 'created_by')
 
+@admin.register(StockLot)
+class StockLotAdmin(admin.ModelAdmin):
+    list_display = ['product', 'batch_number', 'expiry_date', 'quantity', 'updated_at']
+    list_filter = ['expiry_date']
+    search_fields = ['product__name', 'batch_number']
+    readonly_fields = ['product', 'batch_number', 'expiry_date', 'quantity', 'created_at', 'updated_at']
+    change_list_template = 'admin/products/stocklot/change_list.html'
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+    
+    def get_urls(self):
+        return [
+            path(
+                'expiry-report/',
+                self.admin_site.admin_view(self.expiry_report_view),
+                name='products_stocklot_expiry_report',
+            ),
+        ] + super().get_urls()
+    
+    def expiry_report_view(self, request):
+        """Expired, near-expiry and idle lots as a streamed CSV download"""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        try:
+            expiry_days = int(request.GET.get('days', reports.DEFAULT_EXPIRY_DAYS))
+            idle_days = int(request.GET.get('idle_days', reports.DEFAULT_IDLE_DAYS))
+        except ValueError:
+            return HttpResponseBadRequest('days and idle_days must be whole numbers')
+        
+        rows = reports.expiry_report_rows(expiry_days, idle_days)
+        response = StreamingHttpResponse(reports.stream_csv(rows), content_type='text/csv')
+        filename = f'stock-expiry-{timezone.localdate().isoformat()}.csv'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
 @admin.register(ProductTag)
 class ProductTagAdmin(admin.ModelAdmin):
     list_display = ['name', 'product_count']
@@ -0,0 +1,100 @@
+"""Catalog caches and the shared version counters that invalidate them.
+
+Each named counter is a CacheVersion row, so a bump from any worker or
+management command is seen by every process on its next read. Readers
+compare it against the version their cached data was built from, or fold
+it into their cache keys; the cached data itself may then live in a
+per-process cache without ever being served stale.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from .models import CacheVersion
+
+
+def get_version(name):
+    version = CacheVersion.objects.filter(name=name).values_list('version', flat=True).first()
+    if version is None:
+        version = CacheVersion.objects.get_or_create(name=name)[0].version
+    return version
+
+
+def bump_version(name):
+    if not CacheVersion.objects.filter(name=name).update(version=F('version') + 1):
+        CacheVersion.objects.get_or_create(name=name)
+        CacheVersion.objects.filter(name=name).update(version=F('version') + 1)
+    return get_version(name)
+
+
+CATALOG_VERSION = 'catalog'
+
+# Parameters that define a catalog result set
+CATALOG_FILTER_PARAMS = (
+    'query', 'category', 'manufacturer', 'min_price', 'max_price',
+    'prescription_required', 'in_stock', 'sort',
+)
+
+
+def catalog_timeout():
+    return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+
+
+def filter_signature(params, price_field='patient_price'):
+    """Stable hash of the catalog filters, ignoring paging and cosmetic noise
+    
+    `price_field` is part of the signature because price filters and
+    sorting run on the viewer's own price column.
+    """
+    normalized = {name: (params.get(name) or '').strip() for name in CATALOG_FILTER_PARAMS}
+    normalized['price_field'] = price_field
+    normalized['query'] = ' '.join(normalized['query'].lower().split())
+    normalized['sort'] = normalized['sort'] or 'relevance'
+    raw = json.dumps(normalized, sort_keys=True)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def catalog_key(kind, signature):
+    return f'products:catalog:{kind}:{get_version(CATALOG_VERSION)}:{signature}'
+
+
+class CachedResultList:
+    """Paginator-friendly view of a cached, ordered id list
+    
+    Slices inside the cached ids load just those rows through `queryset`
+    (keeping its select/prefetch setup); deeper slices fall back to it.
+    """
+    
+    def __init__(self, queryset, ids, total):
+        self.queryset = queryset
+        self.ids = ids
+        self.total = total
+    
+    def count(self):
+        return self.total
+    
+    def __len__(self):
+        return self.total
+    
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or (key.stop or 0) > len(self.ids):
+            return self.queryset[key]
+        ids = self.ids[key]
+        rows = {obj.pk: obj for obj in self.queryset.filter(pk__in=ids)}
+        return [rows[pk] for pk in ids if pk in rows]
+
+
+def cached_catalog_results(queryset, signature, max_ids=None):
+    """Wrap `queryset` so its ordering and count come from the cache"""
+    max_ids = max_ids or getattr(settings, 'CATALOG_CACHE_MAX_IDS', 1200)
+    key = catalog_key('results', signature)
+    entry = cache.get(key)
+    if entry is None:
+        ids = list(queryset.values_list('pk', flat=True)[:max_ids + 1])
+        total = len(ids) if len(ids) <= max_ids else queryset.count()
+        entry = {'ids': ids[:max_ids], 'total': total}
+        cache.set(key, entry, catalog_timeout())
+    return CachedResultList(queryset, entry['ids'], entry['total'])
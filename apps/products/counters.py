@@ -0,0 +1,75 @@
+"""Buffered product view counts.
+
+Detail page hits are tallied in process memory and written in one UPDATE
+once the buffer is old or large enough, instead of one write per hit.
+Whatever is pending is flushed at interpreter exit, which covers graceful
+worker shutdown (gunicorn exits workers through sys.exit).
+"""
+import atexit
+import logging
+import time
+from collections import Counter
+from threading import Lock
+
+from django.conf import settings
+from django.db import models
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCountBuffer:
+    def __init__(self, flush_interval, flush_size):
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._pending = Counter()
+        self._hits = 0
+        self._last_flush = time.monotonic()
+        self._lock = Lock()
+
+    def add(self, product_id, amount=1):
+        with self._lock:
+            self._pending[product_id] += amount
+            self._hits += amount
+            due = (
+                self._hits >= self.flush_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if due:
+            try:
+                self.flush()
+            except Exception:
+                # Best effort: the counts stay pending, the page view goes on
+                logger.exception("Could not flush product view counts")
+
+    def flush(self):
+        """Write pending counts in one UPDATE; returns the number of hits written"""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            hits, self._hits = self._hits, 0
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        from .models import Product
+        try:
+            Product.objects.filter(pk__in=pending).update(
+                view_count=models.F('view_count') + models.Case(
+                    *[models.When(pk=pk, then=models.Value(count)) for pk, count in pending.items()],
+                    output_field=models.PositiveIntegerField()
+                )
+            )
+        except Exception:
+            # Keep the counts for the next attempt rather than dropping them
+            with self._lock:
+                self._pending.update(pending)
+                self._hits += hits
+            raise
+        return hits
+
+
+view_counts = ViewCountBuffer(
+    flush_interval=settings.VIEW_COUNT_FLUSH_INTERVAL,
+    flush_size=settings.VIEW_COUNT_FLUSH_SIZE,
+)
+
+atexit.register(view_counts.flush)
@@ -0,0 +1,103 @@
+"""Facet counts for the catalog filters.
+
+Counts come from three queries over the already-filtered result set:
+one conditional aggregate for the Rx/stock/price facets and one GROUP BY
+each for categories and manufacturers.
+"""
+from django.db.models import Count, Q
+
+from .models import Category, Product
+
+# (min, max) price bounds; None leaves that side open
+PRICE_BUCKETS = [
+    (None, 100),
+    (100, 250),
+    (250, 500),
+    (500, 1000),
+    (1000, None),
+]
+
+MANUFACTURER_LIMIT = 10
+
+
+def price_bucket_label(low, high):
+    if low is None:
+        return f"Under ₹{high}"
+    if high is None:
+        return f"₹{low} & above"
+    return f"₹{low} – ₹{high}"
+
+
+def price_bucket_filter(price_field, low, high):
+    bounds = Q()
+    if low is not None:
+        bounds &= Q(**{f'{price_field}__gte': low})
+    if high is not None:
+        bounds &= Q(**{f'{price_field}__lt': high})
+    return bounds
+
+
+def compute_facets(queryset, parent=None, price_field='patient_price'):
+    """Facet counts for `queryset`
+    
+    Category counts include active subcategories; only the children of
+    `parent` (top-level categories when None) are listed.
+    """
+    base = queryset.order_by()
+    
+    aggregates = {
+        'total': Count('id'),
+        'in_stock': Count('id', filter=Q(stock_quantity__gt=0)),
+    }
+    for value, _ in Product.PRESCRIPTION_CHOICES:
+        aggregates[f'rx_{value}'] = Count('id', filter=Q(prescription_required=value))
+    for i, (low, high) in enumerate(PRICE_BUCKETS):
+        aggregates[f'price_{i}'] = Count('id', filter=price_bucket_filter(price_field, low, high))
+    summary = base.aggregate(**aggregates)
+    
+    by_category = dict(base.values_list('category_id').annotate(total=Count('id')))
+    categories = list(
+        Category.objects.filter(is_active=True).only('id', 'name', 'slug', 'parent_id', 'path')
+    )
+    paths = {category.id: category.path for category in categories}
+    rolled_up = {}
+    for category_id, total in by_category.items():
+        path = paths.get(category_id, '')
+        # Same reach rule as the category filter: stop above an inactive node
+        for pk in reversed([int(pk) for pk in path.strip('/').split('/') if pk]):
+            if pk not in paths:
+                break
+            rolled_up[pk] = rolled_up.get(pk, 0) + total
+    parent_id = parent.pk if parent else None
+    category_facets = [
+        {'value': category.slug, 'label': category.name, 'count': rolled_up[category.id]}
+        for category in categories
+        if category.parent_id == parent_id and rolled_up.get(category.id)
+    ]
+    
+    manufacturer_facets = [
+        {'value': row['manufacturer__slug'], 'label': row['manufacturer__name'], 'count': row['total']}
+        for row in base.values('manufacturer__slug', 'manufacturer__name')
+        .annotate(total=Count('id'))
+        .order_by('-total', 'manufacturer__name')[:MANUFACTURER_LIMIT]
+    ]
+    
+    return {
+        'total': summary['total'],
+        'categories': category_facets,
+        'manufacturers': manufacturer_facets,
+        'prescription': [
+            {'value': value, 'label': label, 'count': summary[f'rx_{value}']}
+            for value, label in Product.PRESCRIPTION_CHOICES
+        ],
+        'in_stock': summary['in_stock'],
+        'price_ranges': [
+            {
+                'min': low,
+                'max': high,
+                'label': price_bucket_label(low, high),
+                'count': summary[f'price_{i}'],
+            }
+            for i, (low, high) in enumerate(PRICE_BUCKETS)
+        ],
+    }
@@ -99,6 +99,7 @@ class ProductFilterForm(forms.Form):
     """Advanced product filtering form"""
     
     SORT_CHOICES = [
+        ('relevance', 'Best Match'),
         ('name', 'Name (A-Z)'),
         ('-name', 'Name (Z-A)'),
         ('patient_price', 'Price (Low to High)'),
@@ -111,7 +112,7 @@ class ProductFilterForm(forms.Form):
     sort = forms.ChoiceField(
         choices=SORT_CHOICES,
         required=False,
-        initial='-created_at',
+        initial='relevance',
         widget=forms.Select(attrs={
             'class': 'w-full px-3 py-2 border border-gray-300 rounded-lg focus:outline-none focus:border-blue-500'
         })
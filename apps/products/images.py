@@ -0,0 +1,124 @@
+"""
+Content-addressed storage for product images.
+
+Files are named by the SHA-256 of their bytes, so a stored name never
+changes meaning: identical uploads share one file and the image endpoint
+can mark responses immutable and answer revalidations from the URL alone.
+"""
+import hashlib
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from threading import Lock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+IMAGE_ROOT = 'products/images'
+
+CONTENT_TYPES = {
+    'jpg': 'image/jpeg',
+    'png': 'image/png',
+    'gif': 'image/gif',
+    'webp': 'image/webp',
+}
+
+PIL_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+# Derived sizes (bounding boxes; smaller originals are never upscaled)
+DERIVATIVE_SIZES = {
+    'card': (400, 400),
+    'detail': (800, 800),
+    'zoom': (1600, 1600),
+}
+
+# Derived formats: extension -> (Pillow format, save options)
+DERIVATIVE_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Only names we produced are ever served: "<sha256>.<ext>"
+NAME_RE = re.compile(r'^(?P<digest>[0-9a-f]{64})\.(?P<ext>%s)$' % '|'.join(CONTENT_TYPES))
+
+
+def guess_extension(content):
+    """File extension for the image bytes, defaulting to jpg"""
+    try:
+        return PIL_EXTENSIONS.get(Image.open(BytesIO(content)).format, 'jpg')
+    except (UnidentifiedImageError, OSError):
+        return 'jpg'
+
+
+def storage_name(filename):
+    """Storage path for a "<digest>.<ext>" file name, fanned out by prefix"""
+    return f"{IMAGE_ROOT}/{filename[:2]}/{filename}"
+
+
+def store_image(content):
+    """Write image bytes (once per distinct content) and return the storage name"""
+    filename = f"{hashlib.sha256(content).hexdigest()}.{guess_extension(content)}"
+    name = storage_name(filename)
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(content))
+    return name
+
+
+def image_url(name):
+    """Endpoint URL for a stored image name"""
+    return reverse('products:image', kwargs={'filename': name.rsplit('/', 1)[-1]})
+
+
+def render_derivatives(content):
+    """Encode every size/format pair for the image bytes, keyed "<size>.<ext>" """
+    image = ImageOps.exif_transpose(Image.open(BytesIO(content)))
+    if image.mode in ('RGBA', 'LA', 'P'):
+        # Flatten transparency onto white so JPEG and WebP match
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    rendered = {}
+    for size, box in DERIVATIVE_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail(box, Image.Resampling.LANCZOS)
+        for ext, (format, options) in DERIVATIVE_FORMATS.items():
+            output = BytesIO()
+            resized.save(output, format=format, **options)
+            rendered[f"{size}.{ext}"] = output.getvalue()
+    return rendered
+
+
+def generate_derivatives(name):
+    """Render and store the derivatives of a stored original.
+
+    Runs inside pool workers: it only touches storage, never the database,
+    and returns {"<size>.<ext>": storage name}.
+    """
+    with default_storage.open(name) as handle:
+        content = handle.read()
+    return {key: store_image(data) for key, data in render_derivatives(content).items()}
+
+
+_pool = None
+_pool_lock = Lock()
+
+
+def get_pool():
+    """Process pool for derivative rendering, created on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded server process is not safe
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_DERIVATIVE_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
@@ -0,0 +1,420 @@
+"""Lot-level stock allocation.
+
+Orders draw stock first-expiry-first-out from StockLot rows that hold
+quantity and have not expired. Stock received without a batch or expiry
+("unlotted", e.g. opening balances) is used only once the lots run out.
+Lots are read through the partial (product, expiry_date) index over lots
+with stock on hand, a page at a time, so the cost of an allocation
+depends on the lots it draws from, not on how many lots a product has
+ever had.
+
+Stock held for checkouts in progress (StockHold) is not available to
+anyone else until the hold expires or its checkout completes.
+"""
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import caching
+from .models import Product, Stock, StockHold, StockLot
+
+LOT_PAGE_SIZE = 10
+
+
+class InsufficientStock(Exception):
+    def __init__(self, shortages):
+        # [(product, requested, available)]
+        self.shortages = shortages
+        super().__init__('; '.join(
+            f'{product.name}: {requested} requested, {available} available'
+            for product, requested, available in shortages
+        ))
+
+
+@contextmanager
+def stock_transaction(using=DEFAULT_DB_ALIAS):
+    """transaction.atomic() that takes the SQLite write lock as it begins.
+
+    Checkouts read stock and lots before writing them; in a deferred
+    transaction a concurrent writer makes that upgrade fail at once with
+    "database is locked" instead of waiting for the lock. Other databases,
+    and blocks nested in an open transaction, get a plain atomic().
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        with transaction.atomic(using=using):
+            yield
+        return
+    connection.ensure_connection()
+    mode = connection.transaction_mode
+    connection.transaction_mode = 'IMMEDIATE'
+    try:
+        with transaction.atomic(using=using):
+            connection.transaction_mode = mode
+            yield
+    finally:
+        connection.transaction_mode = mode
+
+
+def _lot_pages(queryset):
+    offset = 0
+    while True:
+        page = list(queryset[offset:offset + LOT_PAGE_SIZE])
+        yield from page
+        if len(page) < LOT_PAGE_SIZE:
+            return
+        offset += LOT_PAGE_SIZE
+
+
+def plan_fefo(product, quantity, today=None):
+    """[(lot, quantity)] covering `quantity` of `product`, soonest expiry
+    first; lot is None for the unlotted share. Raises InsufficientStock.
+
+    Lots expiring today or earlier are never planned.
+    """
+    today = today or timezone.localdate()
+    lots = StockLot.objects.select_for_update().filter(product=product, quantity__gt=0)
+    plan = []
+    needed = quantity
+    for candidates in (
+        lots.filter(expiry_date__gt=today).order_by('expiry_date', 'id'),
+        lots.filter(expiry_date__isnull=True).order_by('id'),
+    ):
+        for lot in _lot_pages(candidates):
+            take = min(lot.quantity, needed)
+            plan.append((lot, take))
+            needed -= take
+            if not needed:
+                return plan
+
+    # Whatever stock no lot accounts for (expired lots included) is unlotted
+    stock = Product.objects.filter(pk=product.pk).values_list('stock_quantity', flat=True).get()
+    lotted = lots.aggregate(total=Sum('quantity'))['total'] or 0
+    unlotted = max(stock - lotted, 0)
+    if unlotted < needed:
+        raise InsufficientStock([(product, quantity, quantity - needed + unlotted)])
+    plan.append((None, needed))
+    return plan
+
+
+def _merge_lines(lines):
+    """{product pk: [product, quantity]}, one entry per product"""
+    merged = {}
+    for product, quantity in lines:
+        merged.setdefault(product.pk, [product, 0])[1] += quantity
+    return merged
+
+
+def _adjust_lots(deltas):
+    """Apply {lot pk: delta} to lot quantities in one UPDATE"""
+    if deltas:
+        StockLot.objects.filter(pk__in=deltas).update(
+            quantity=F('quantity') + Case(
+                *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+                output_field=IntegerField()
+            ),
+            updated_at=timezone.now()
+        )
+
+
+def _trim_plan(lots, balance, limit):
+    """[(lot, quantity)] taking at most `limit` units out of `lots` until
+    they hold no more than `balance`, soonest expiry first, undated last"""
+    plan = []
+    excess = min(sum(lot.quantity for lot in lots) - balance, limit)
+    for lot in sorted(lots, key=lambda lot: (lot.expiry_date is None, lot.expiry_date, lot.pk)):
+        if excess <= 0:
+            break
+        take = min(lot.quantity, excess)
+        plan.append((lot, take))
+        excess -= take
+    return plan
+
+
+def trim_lots(product_id, limit):
+    """Bring the product's lots back within its stock after a decrease
+    that named no lot, taking at most `limit` units the way adjust_stock
+    does. Run it inside the caller's transaction; returns the plan."""
+    balance = Product.objects.filter(pk=product_id).values_list('stock_quantity', flat=True).get()
+    lots = list(StockLot.objects.select_for_update().filter(product_id=product_id, quantity__gt=0))
+    plan = _trim_plan(lots, balance, limit)
+    _adjust_lots({lot.pk: -take for lot, take in plan})
+    return plan
+
+
+def _lot_movements(product, plan, balance, movement_type, sign, reference, notes):
+    """One movement per (lot, quantity), with running balances as if
+    they had been saved one by one, ending at `balance`"""
+    running = balance - sign * sum(quantity for _lot, quantity in plan)
+    movements = []
+    for lot, quantity in plan:
+        running += sign * quantity
+        movements.append(Stock(
+            product=product,
+            movement_type=movement_type,
+            quantity=sign * quantity,
+            lot=lot,
+            batch_number=lot.batch_number if lot else '',
+            expiry_date=lot.expiry_date if lot else None,
+            balance_after=running,
+            reference=reference,
+            notes=notes,
+        ))
+    return movements
+
+
+def held_quantities(product_ids, exclude_key=None):
+    """{product id: quantity} under active holds, other than `exclude_key`'s"""
+    holds = StockHold.objects.filter(product_id__in=product_ids, expires_at__gt=timezone.now())
+    if exclude_key:
+        holds = holds.exclude(key=exclude_key)
+    return dict(holds.order_by().values('product_id').annotate(held=Sum('quantity')).values_list('product_id', 'held'))
+
+
+def sellable_quantities(product_ids, today=None):
+    """{product id: quantity} that plan_fefo can ship: unexpired lots plus
+    unlotted stock. Expired units stay in stock_quantity until written off.
+    """
+    today = today or timezone.localdate()
+    stock = dict(Product.objects.filter(pk__in=product_ids).values_list('pk', 'stock_quantity'))
+    lots = {
+        pk: (lotted, expired or 0)
+        for pk, lotted, expired in StockLot.objects.filter(product_id__in=stock, quantity__gt=0)
+        .order_by().values('product_id')
+        .annotate(lotted=Sum('quantity'), expired=Sum('quantity', filter=Q(expiry_date__lte=today)))
+        .values_list('product_id', 'lotted', 'expired')
+    }
+    return {pk: _sellable(quantity, *lots.get(pk, (0, 0))) for pk, quantity in stock.items()}
+
+
+def _sellable(stock, lotted, expired):
+    # Never more than stock, even when lot totals have drifted above it
+    return min(max(stock - lotted, 0) + lotted - expired, stock)
+
+
+def _total(queryset):
+    """Subquery: sum of `queryset`'s quantities for the outer product"""
+    return Coalesce(
+        Subquery(queryset.order_by().values('product').annotate(total=Sum('quantity')).values('total')[:1]), 0
+    )
+
+
+def available_quantity(product, exclude_key=None):
+    """Sellable stock not held for someone else's checkout, in one query"""
+    lots = StockLot.objects.filter(product=OuterRef('pk'), quantity__gt=0)
+    holds = StockHold.objects.filter(product=OuterRef('pk'), expires_at__gt=timezone.now())
+    if exclude_key:
+        holds = holds.exclude(key=exclude_key)
+    stock, lotted, expired, held = Product.objects.filter(pk=product.pk).annotate(
+        lotted=_total(lots),
+        expired=_total(lots.filter(expiry_date__lte=timezone.localdate())),
+        held=_total(holds),
+    ).values_list('stock_quantity', 'lotted', 'expired', 'held').get()
+    return max(_sellable(stock, lotted, expired) - held, 0)
+
+
+def hold_stock(lines, key, ttl=None):
+    """Replace `key`'s holds with holds on (product, quantity) lines for
+    `ttl` seconds (default STOCK_HOLD_TTL). A line holds only what is
+    available; returns the shortfalls as [(product, requested, available)].
+    """
+    ttl = settings.STOCK_HOLD_TTL if ttl is None else ttl
+    merged = {
+        pk: line for pk, line in _merge_lines(lines).items()
+        if line[0].track_inventory and line[1] > 0
+    }
+    shortages = []
+    with stock_transaction():
+        release_holds(key)
+        held = held_quantities(merged, exclude_key=key)
+        stock = sellable_quantities(merged)
+        expires_at = timezone.now() + timedelta(seconds=ttl)
+        holds = []
+        for pk, (product, quantity) in merged.items():
+            available = max(stock.get(pk, 0) - held.get(pk, 0), 0)
+            if available < quantity:
+                shortages.append((product, quantity, available))
+            if min(available, quantity):
+                holds.append(StockHold(product_id=pk, key=key, quantity=min(available, quantity), expires_at=expires_at))
+        StockHold.objects.bulk_create(holds)
+    return shortages
+
+
+def release_holds(key):
+    StockHold.objects.filter(key=key).delete()
+
+
+def allocate_stock(lines, reference='', notes='', hold_key=None):
+    """Draw each (product, quantity) line FEFO: one conditional UPDATE per
+    product, one UPDATE for all lots drawn from, and one bulk insert of
+    OUT movements, one per lot.
+
+    Stock held for other checkouts is off limits; the holds of `hold_key`
+    (the checkout being completed) are consumed. Raises InsufficientStock
+    listing every line that cannot be covered. Run it inside the caller's
+    transaction: lots are locked while planned and nothing partial
+    survives a shortage. Returns the movements.
+    """
+    today = timezone.localdate()
+    plans = []
+    shortages = []
+    for product, quantity in _merge_lines(lines).values():
+        if not product.track_inventory or quantity <= 0:
+            continue
+        try:
+            plans.append((product, quantity, plan_fefo(product, quantity, today)))
+        except InsufficientStock as exc:
+            shortages.extend(exc.shortages)
+    if shortages:
+        raise InsufficientStock(shortages)
+
+    movements = []
+    lot_deltas = {}
+    product_ids = [product.pk for product, _quantity, _plan in plans]
+    held = held_quantities(product_ids, exclude_key=hold_key)
+    stock = dict(Product.objects.select_for_update().filter(pk__in=product_ids).values_list('pk', 'stock_quantity'))
+    sellable = sellable_quantities(product_ids, today)
+    for product, quantity, plan in plans:
+        # Decrement only if the stock is still there: a concurrent checkout
+        # that won the race makes this a shortage, never negative stock.
+        # Holds and expired units are both off limits.
+        reserved = held.get(product.pk, 0)
+        unsellable = max(stock[product.pk] - sellable[product.pk], 0)
+        decremented = Product.objects.filter(
+            pk=product.pk, stock_quantity__gte=quantity + reserved + unsellable
+        ).update(stock_quantity=F('stock_quantity') - quantity)
+        balance = Product.objects.filter(pk=product.pk).values_list('stock_quantity', flat=True).get()
+        product.stock_quantity = balance
+        if not decremented:
+            shortages.append((product, quantity, max(balance - unsellable - reserved, 0)))
+            continue
+        for lot, take in plan:
+            if lot is not None:
+                lot_deltas[lot.pk] = -take
+        movements += _lot_movements(product, plan, balance, 'OUT', -1, reference, notes)
+    if shortages:
+        raise InsufficientStock(shortages)
+
+    _adjust_lots(lot_deltas)
+    Stock.objects.bulk_create(movements)
+    if hold_key:
+        release_holds(hold_key)
+    if movements:
+        # bulk_create sends no signals; stock drives the in-stock filters
+        caching.bump_version(caching.CATALOG_VERSION)
+    return movements
+
+
+def release_stock(lines, reference='', notes=''):
+    """Put (product, quantity) lines back as RETURN movements: into the
+    lots that the OUT movements recorded under `reference` drew from,
+    and any remainder (e.g. orders placed before lots) as unlotted stock.
+
+    Product and lot balances move by one UPDATE each. Returns the movements.
+    """
+    merged = {
+        pk: line for pk, line in _merge_lines(lines).items()
+        if line[0].track_inventory and line[1] > 0
+    }
+    if not merged:
+        return []
+
+    drawn = {}
+    if reference:
+        shipped = Stock.objects.filter(
+            reference=reference, movement_type='OUT', product_id__in=merged, lot__isnull=False
+        ).select_related('lot').order_by('id')
+        for movement in shipped:
+            drawn.setdefault(movement.product_id, []).append((movement.lot, -movement.quantity))
+
+    Product.objects.filter(pk__in=merged).update(
+        stock_quantity=F('stock_quantity') + Case(
+            *[When(pk=pk, then=Value(quantity)) for pk, (_product, quantity) in merged.items()],
+            output_field=IntegerField()
+        )
+    )
+    balances = dict(Product.objects.filter(pk__in=merged).values_list('pk', 'stock_quantity'))
+
+    movements = []
+    lot_deltas = {}
+    for pk, (product, quantity) in merged.items():
+        plan = []
+        remaining = quantity
+        for lot, taken in drawn.get(pk, []):
+            back = min(taken, remaining)
+            if back:
+                plan.append((lot, back))
+                lot_deltas[lot.pk] = lot_deltas.get(lot.pk, 0) + back
+                remaining -= back
+        if remaining:
+            plan.append((None, remaining))
+        product.stock_quantity = balances[pk]
+        movements += _lot_movements(product, plan, balances[pk], 'RETURN', 1, reference, notes)
+
+    _adjust_lots(lot_deltas)
+    Stock.objects.bulk_create(movements)
+    caching.bump_version(caching.CATALOG_VERSION)
+    return movements
+
+
+def adjust_stock(changes, movement_type='ADJUSTMENT', notes=''):
+    """Apply (product, delta) changes relative to the live stock, clamped
+    at zero: one UPDATE for products, one for lots and one bulk insert of
+    movements with running balances.
+
+    Increases carry no batch and stay unlotted. Decreases come out of
+    unlotted stock first, then lots soonest-expiring first, so lot totals
+    never exceed stock. Run it inside the caller's transaction. Returns
+    the movements.
+    """
+    merged = {pk: line for pk, line in _merge_lines(changes).items() if line[1]}
+    current = dict(
+        Product.objects.select_for_update().filter(pk__in=merged).values_list('pk', 'stock_quantity')
+    )
+    applied = {
+        pk: max(current[pk] + delta, 0) - current[pk]
+        for pk, (_product, delta) in merged.items()
+        if pk in current and max(current[pk] + delta, 0) != current[pk]
+    }
+    if not applied:
+        return []
+    Product.objects.filter(pk__in=applied).update(
+        stock_quantity=F('stock_quantity') + Case(
+            *[When(pk=pk, then=Value(delta)) for pk, delta in applied.items()],
+            output_field=IntegerField()
+        )
+    )
+
+    lots = {}
+    for lot in StockLot.objects.filter(
+        product_id__in=[pk for pk, delta in applied.items() if delta < 0], quantity__gt=0
+    ):
+        lots.setdefault(lot.product_id, []).append(lot)
+
+    movements = []
+    lot_deltas = {}
+    for pk, delta in applied.items():
+        product = merged[pk][0]
+        balance = current[pk] + delta
+        product.stock_quantity = balance
+        if delta > 0:
+            movements += _lot_movements(product, [(None, delta)], balance, movement_type, 1, '', notes)
+            continue
+
+        plan = _trim_plan(lots.get(pk, []), balance, -delta)
+        for lot, take in plan:
+            lot_deltas[lot.pk] = -take
+        remaining = -delta - sum(take for _lot, take in plan)
+        if remaining:
+            plan.insert(0, (None, remaining))
+        movements += _lot_movements(product, plan, balance, movement_type, -1, '', notes)
+
+    _adjust_lots(lot_deltas)
+    Stock.objects.bulk_create(movements)
+    caching.bump_version(caching.CATALOG_VERSION)
+    return movements
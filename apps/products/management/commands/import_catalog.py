@@ -0,0 +1,287 @@
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from apps.products import caching, inventory, search, suggestions
+from apps.products.models import Category, Manufacturer, Product
+
+PRICE_FIELDS = ['mrp_price', 'patient_price', 'pharmacy_price', 'cost_price']
+TEXT_FIELDS = [
+    'description', 'short_description', 'composition', 'dosage_form', 'strength', 'pack_size',
+    'meta_title', 'meta_description', 'meta_keywords',
+]
+# Columns written on existing products; name and manufacturer identify the row.
+# stock_quantity is not among them: it moves by relative updates (see import_batch)
+UPDATE_FIELDS = [
+    'name', 'manufacturer', 'category', 'prescription_required', 'low_stock_threshold', 'is_active',
+    *PRICE_FIELDS, *TEXT_FIELDS, 'updated_at',
+]
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+RX_VALUES = {'rx', *TRUE_VALUES}
+
+
+class RowError(ValueError):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Import or update products from a CSV or JSON Lines catalog feed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Feed file (.csv or .jsonl)')
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            help='Feed format (default: from the file extension)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows written per transaction (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'{path} does not exist')
+        feed_format = options['format'] or ('jsonl' if path.suffix in ('.jsonl', '.ndjson') else 'csv')
+
+        self.categories = {
+            (category.parent_id, category.name.lower()): category for category in Category.objects.all()
+        }
+        self.manufacturers = {
+            manufacturer.name.lower(): manufacturer for manufacturer in Manufacturer.objects.all()
+        }
+
+        started = time.monotonic()
+        created, updated = set(), set()
+        processed = skipped = 0
+        with path.open(newline='', encoding='utf-8') as feed:
+            rows = self.read_rows(feed, feed_format)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                # Categories and manufacturers created by a batch join the
+                # lookups only once it commits, so a rolled-back batch
+                # leaves no unsaved rows behind for later ones
+                self.new_categories, self.new_manufacturers = {}, {}
+                with transaction.atomic():
+                    batch_created, batch_updated, batch_skipped = self.import_batch(batch)
+                self.categories.update(self.new_categories)
+                self.manufacturers.update(self.new_manufacturers)
+                created |= batch_created
+                updated |= batch_updated
+                skipped += batch_skipped
+                processed += len(batch)
+                self.stdout.write(
+                    f'{processed} rows ({processed / (time.monotonic() - started):.0f} rows/s)'
+                )
+
+        # bulk_create/bulk_update bypass the signals that keep these current
+        Category.rebuild_product_counts()
+        Manufacturer.rebuild_product_counts()
+        caching.bump_version(caching.CATALOG_VERSION)
+        suggestions.invalidate()
+
+        elapsed = time.monotonic() - started
+        rate = processed / elapsed if elapsed else processed
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {processed} rows in {elapsed:.1f}s ({rate:.0f} rows/s): '
+            f'{len(created)} products created, {len(updated - created)} updated, {skipped} rows skipped'
+        ))
+
+    def read_rows(self, feed, feed_format):
+        """Yield row dicts without loading the whole feed"""
+        if feed_format == 'csv':
+            yield from csv.DictReader(feed)
+        else:
+            for line in feed:
+                if line.strip():
+                    yield json.loads(line)
+
+    def import_batch(self, batch):
+        parsed = []
+        skipped = 0
+        for row in batch:
+            try:
+                parsed.append(self.parse_row(row))
+            except RowError as exc:
+                skipped += 1
+                self.stderr.write(f'Skipped {row.get("name") or "row"}: {exc}')
+
+        # Rows match existing products by explicit slug, otherwise by
+        # (name, manufacturer): one query each per batch
+        by_slug = {
+            product.slug: product
+            for product in Product.objects.filter(slug__in=[item['slug'] for item in parsed if item['explicit_slug']])
+        }
+        by_identity = {
+            (product.name, product.manufacturer_id): product
+            for product in Product.objects.filter(name__in={item['name'] for item in parsed if not item['explicit_slug']})
+        }
+        taken = set(Product.objects.filter(slug__in=[item['slug'] for item in parsed]).values_list('slug', flat=True))
+
+        to_create, to_update = [], {}
+        stock_targets = {}  # id(product) -> (product, feed stock)
+        # Products already handled in this batch, under both keys, so a
+        # later row finds them whichever way it identifies the product
+        seen_slugs, seen_identities = {}, {}
+        now = timezone.now()
+        for item in parsed:
+            stock = item.pop('stock_quantity')
+            if item.pop('explicit_slug'):
+                product = seen_slugs.get(item['slug']) or by_slug.get(item['slug'])
+            else:
+                key = (item['name'], item['manufacturer'].pk)
+                product = seen_identities.get(key) or by_identity.get(key)
+            if product is None:
+                if item['slug'] in taken:
+                    item['slug'] = self.free_slug(item['slug'], taken)
+                taken.add(item['slug'])
+                product = Product(stock_quantity=0, **item)
+                to_create.append(product)
+            else:
+                item.pop('slug')
+                for field, value in item.items():
+                    setattr(product, field, value)
+                product.updated_at = now
+                if product.pk:
+                    to_update[product.pk] = product
+            if stock is not None:
+                stock_targets[id(product)] = (product, stock)
+            seen_slugs[product.slug] = product
+            seen_identities[(product.name, product.manufacturer.pk)] = product
+
+        Product.objects.bulk_create(to_create)
+        Product.objects.bulk_update(to_update.values(), UPDATE_FIELDS)
+
+        # Opening stock for new products is recorded as a movement, like
+        # StockInline does. Existing products move by the difference from
+        # the stock read for this batch, applied relative to the live value,
+        # so checkouts that commit during the import are kept rather than
+        # overwritten. Both get running balances and keep lots within stock.
+        created = {id(product) for product in to_create}
+        inventory.adjust_stock(
+            [(product, stock) for product, stock in stock_targets.values() if id(product) in created],
+            movement_type='IN',
+            notes='Catalog import',
+        )
+        inventory.adjust_stock(
+            [
+                (product, stock - product.stock_quantity)
+                for product, stock in stock_targets.values() if product.pk in to_update
+            ],
+            notes='Catalog import',
+        )
+
+        imported = [product.pk for product in to_create] + list(to_update)
+        if imported:
+            search.reindex_products(pk__in=imported)
+        # Distinct products: repeated rows for one product count once
+        return {product.pk for product in to_create}, set(to_update), skipped
+
+    def parse_row(self, row):
+        name = (row.get('name') or '').strip()
+        if not name:
+            raise RowError('name is required')
+        manufacturer = self.resolve_manufacturer(row.get('manufacturer'))
+        slug = slugify(row.get('slug') or '')
+        prescription = str(row.get('prescription_required') or '').strip().lower()
+        item = {
+            'name': name,
+            'manufacturer': manufacturer,
+            'category': self.resolve_category(row.get('category')),
+            # Same default as Product.save
+            'slug': slug or slugify(f"{name}-{manufacturer.name}"),
+            'explicit_slug': bool(slug),
+            'prescription_required': 'RX' if prescription in RX_VALUES else 'OTC',
+            'is_active': str(row.get('is_active', 'true')).strip().lower() in TRUE_VALUES,
+            'low_stock_threshold': self.parse_int(row, 'low_stock_threshold', default=10),
+            'stock_quantity': self.parse_int(row, 'stock_quantity', default=None),
+        }
+        for field in TEXT_FIELDS:
+            item[field] = str(row.get(field) or '')
+        if not item['short_description']:
+            item['short_description'] = item['description'][:500]
+        for field in PRICE_FIELDS:
+            item[field] = self.parse_price(row, field, required=field != 'cost_price')
+        return item
+
+    def parse_price(self, row, field, required=True):
+        value = row.get(field)
+        if value in (None, ''):
+            if required:
+                raise RowError(f'{field} is required')
+            return None
+        try:
+            return Decimal(str(value)).quantize(Decimal('0.01'))
+        except InvalidOperation:
+            raise RowError(f'{field} is not a number: {value!r}')
+
+    def parse_int(self, row, field, default):
+        value = row.get(field)
+        if value in (None, ''):
+            return default
+        try:
+            number = int(value)
+        except (TypeError, ValueError):
+            raise RowError(f'{field} is not a whole number: {value!r}')
+        if number < 0:
+            raise RowError(f'{field} cannot be negative')
+        return number
+
+    def resolve_manufacturer(self, name):
+        name = (name or '').strip()
+        if not name:
+            raise RowError('manufacturer is required')
+        manufacturer = self.manufacturers.get(name.lower()) or self.new_manufacturers.get(name.lower())
+        if manufacturer is None:
+            manufacturer = Manufacturer.objects.create(name=name, slug=self.free_model_slug(Manufacturer, name))
+            self.new_manufacturers[name.lower()] = manufacturer
+        return manufacturer
+
+    def resolve_category(self, value):
+        """Resolve "Parent > Child" paths, creating missing categories"""
+        names = [part.strip() for part in (value or '').split('>') if part.strip()]
+        if not names:
+            raise RowError('category is required')
+        category = None
+        for name in names:
+            parent_id = category.pk if category else None
+            key = (parent_id, name.lower())
+            found = self.categories.get(key) or self.new_categories.get(key)
+            if found is None:
+                found = Category.objects.create(
+                    name=name, parent=category, slug=self.free_model_slug(Category, name)
+                )
+                self.new_categories[key] = found
+            category = found
+        return category
+
+    def free_slug(self, base, taken):
+        """First "<base>-N" not used in the database or earlier in this import"""
+        used = taken | set(Product.objects.filter(slug__startswith=f'{base}-').values_list('slug', flat=True))
+        suffix = 2
+        while f'{base}-{suffix}' in used:
+            suffix += 1
+        return f'{base}-{suffix}'
+
+    def free_model_slug(self, model, name):
+        base = slugify(name)
+        if not model.objects.filter(slug=base).exists():
+            return base
+        used = set(model.objects.filter(slug__startswith=f'{base}-').values_list('slug', flat=True))
+        suffix = 2
+        while f'{base}-{suffix}' in used:
+            suffix += 1
+        return f'{base}-{suffix}'
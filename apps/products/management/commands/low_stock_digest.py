@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from apps.products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'List every product at or below its low stock threshold, grouped by manufacturer'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Rows fetched per round trip (default: 2000)',
+        )
+        parser.add_argument(
+            '--include-inactive',
+            action='store_true',
+            help='Also list products that are not active',
+        )
+
+    def handle(self, *args, **options):
+        products = Product.objects.low_stock()
+        if not options['include_inactive']:
+            products = products.filter(is_active=True)
+        # Index order of product_low_stock: grouped without a sort
+        rows = products.order_by('manufacturer_id', 'stock_quantity', 'id').values_list(
+            'manufacturer_id', 'manufacturer__name', 'id', 'name', 'stock_quantity', 'low_stock_threshold'
+        )
+
+        current = None
+        total = manufacturers = out_of_stock = 0
+        for manufacturer_id, manufacturer, pk, name, stock, threshold in rows.iterator(chunk_size=options['chunk_size']):
+            if manufacturer_id != current:
+                current = manufacturer_id
+                manufacturers += 1
+                self.stdout.write(f'\n{manufacturer}')
+            total += 1
+            if not stock:
+                out_of_stock += 1
+            status = 'OUT' if not stock else 'LOW'
+            self.stdout.write(f'  {status}  {pk:>8}  {name[:50]:<50}  {stock:>6} / {threshold}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\n{total} low stock products ({out_of_stock} out of stock) across {manufacturers} manufacturers'
+        ))
@@ -0,0 +1,70 @@
+import base64
+import binascii
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.products.images import store_image
+from apps.products.models import Product, ProductImage
+
+
+class Command(BaseCommand):
+    help = 'Move base64 product images out of the database into content-addressed files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=100,
+            help='Images loaded and written per batch (default: 100)',
+        )
+        parser.add_argument(
+            '--keep-data',
+            action='store_true',
+            help='Leave the base64 columns filled after writing the files',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        pending = ProductImage.objects.filter(image='').exclude(image_data='').order_by('pk')
+        moved = failed = 0
+        last_pk = 0
+
+        # Walk by primary key so only one chunk of blobs is ever in memory
+        while True:
+            chunk = list(
+                pending.filter(pk__gt=last_pk).only('id', 'product_id', 'image_data', 'thumbnail_data')[:chunk_size]
+            )
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+
+            updated = []
+            for image in chunk:
+                try:
+                    content = base64.b64decode(image.image_data, validate=True)
+                    thumbnail = base64.b64decode(image.thumbnail_data, validate=True) if image.thumbnail_data else None
+                except (binascii.Error, ValueError):
+                    failed += 1
+                    self.stderr.write(f'Image {image.pk}: invalid base64, skipped')
+                    continue
+                image.image.name = store_image(content)
+                if thumbnail:
+                    image.thumbnail.name = store_image(thumbnail)
+                if not options['keep_data']:
+                    image.image_data = image.thumbnail_data = ''
+                updated.append(image)
+
+            with transaction.atomic():
+                ProductImage.objects.bulk_update(
+                    updated, ['image', 'thumbnail', 'image_data', 'thumbnail_data']
+                )
+                # Retire cached product cards that still embed the data URI
+                Product.objects.filter(
+                    pk__in={image.product_id for image in updated}
+                ).update(updated_at=timezone.now())
+            moved += len(updated)
+            self.stdout.write(f'Moved {moved} images')
+
+        self.stdout.write(self.style.SUCCESS(f'Moved {moved} images to file storage ({failed} skipped)'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.products.models import Category, Manufacturer
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored product counts on categories and manufacturers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--paths',
+            action='store_true',
+            help='Also rebuild the materialized category paths first',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['paths']:
+                Category.rebuild_paths()
+                self.stdout.write('Rebuilt category paths')
+            Category.rebuild_product_counts()
+            Manufacturer.rebuild_product_counts()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt product counts for {Category.objects.count()} categories '
+            f'and {Manufacturer.objects.count()} manufacturers'
+        ))
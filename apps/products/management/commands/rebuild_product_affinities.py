@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from apps.products.models import ProductAffinity
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the "frequently bought together" neighbours from order history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=10,
+            help='Neighbours kept per product (default: 10)',
+        )
+
+    def handle(self, *args, **options):
+        written = ProductAffinity.rebuild(top_k=options['top_k'])
+        self.stdout.write(self.style.SUCCESS(f'Stored {written} product affinities'))
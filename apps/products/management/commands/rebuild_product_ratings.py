@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Backfill the stored rating average and count on every product'
+
+    def handle(self, *args, **options):
+        updated = Product.rebuild_ratings()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt ratings for {updated} products'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.products import search
+from apps.products.models import ProductSearchIndex
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text product search index'
+
+    def handle(self, *args, **options):
+        if not search.is_enabled():
+            raise CommandError('Full-text search is only available on SQLite (FTS5)')
+
+        search.reindex_products()
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {ProductSearchIndex.objects.count()} products'
+        ))
@@ -0,0 +1,95 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from apps.products.models import Product, Stock, StockSnapshot
+
+
+class Command(BaseCommand):
+    help = 'Verify Product.stock_quantity against the stock ledger, in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Products checked per query (default: 500)',
+        )
+        parser.add_argument(
+            '--fix',
+            choices=['ledger', 'stock'],
+            help='Resolve mismatches: "ledger" sets stock_quantity from the ledger, '
+                 '"stock" records ADJUSTMENT movements so the ledger matches stock_quantity',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            action='store_true',
+            help='Write snapshots for balanced products so later runs replay less history',
+        )
+
+    def handle(self, *args, **options):
+        latest = StockSnapshot.objects.filter(product=OuterRef('pk')).order_by('-id')
+        products = Product.objects.order_by('pk').annotate(
+            snapshot_balance=Coalesce(Subquery(latest.values('balance')[:1]), 0),
+            snapshot_movement=Coalesce(Subquery(latest.values('last_movement')[:1]), 0),
+        ).annotate(
+            # Snapshot plus every movement recorded after it
+            ledger=F('snapshot_balance') + Stock.ledger_delta(OuterRef('pk'), OuterRef('snapshot_movement')),
+            last_movement=Coalesce(
+                Subquery(Stock.objects.filter(product=OuterRef('pk')).order_by('-id').values('id')[:1]), 0
+            ),
+        ).values_list('pk', 'name', 'stock_quantity', 'ledger', 'snapshot_movement', 'last_movement')
+
+        checked = mismatched = fixed = checkpoints = 0
+        last_pk = 0
+        while True:
+            snapshots = []
+            adjustments = []
+            with transaction.atomic():
+                # Read inside the transaction: each row's balance and
+                # last_movement come from the same statement, so a snapshot
+                # never claims a movement its balance does not include
+                chunk = list(products.filter(pk__gt=last_pk)[:options['chunk_size']])
+                if not chunk:
+                    break
+                last_pk = chunk[-1][0]
+                checked += len(chunk)
+
+                for pk, name, stock, ledger, snapshot_movement, last_movement in chunk:
+                    if stock != ledger:
+                        mismatched += 1
+                        self.stdout.write(f'{pk:>8}  {name[:50]:<50}  stock {stock:>7}  ledger {ledger:>7}')
+                        if options['fix'] == 'ledger':
+                            Product.objects.filter(pk=pk).update(stock_quantity=max(ledger, 0))
+                            stock = max(ledger, 0)
+                            fixed += 1
+                        elif options['fix'] == 'stock':
+                            adjustments.append(Stock(
+                                product_id=pk,
+                                movement_type='ADJUSTMENT',
+                                quantity=stock - ledger,
+                                balance_after=stock,
+                                notes='Stock reconciliation',
+                            ))
+                            fixed += 1
+                        else:
+                            continue
+                    if options['checkpoint'] and (stock != ledger or last_movement != snapshot_movement):
+                        snapshots.append((pk, stock, last_movement))
+
+                # Created directly: stock_quantity already holds the balance
+                Stock.objects.bulk_create(adjustments)
+                if snapshots:
+                    # A snapshot covers the adjustment just written for it
+                    covered = {adjustment.product_id: adjustment.pk for adjustment in adjustments}
+                    written = StockSnapshot.objects.bulk_create([
+                        StockSnapshot(product_id=pk, last_movement=covered.get(pk, last_movement), balance=balance)
+                        for pk, balance, last_movement in snapshots
+                        if covered.get(pk, last_movement)
+                    ])
+                    checkpoints += len(written)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} products: {mismatched} mismatched, {fixed} fixed, {checkpoints} checkpoints written'
+        ))
@@ -0,0 +1,79 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.products.images import generate_derivatives
+from apps.products.models import Product, ProductImage
+
+
+class Command(BaseCommand):
+    help = 'Render card/detail/zoom derivatives for product images in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Worker processes (default: one per core)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=200,
+            help='Images rendered and written per batch (default: 200)',
+        )
+        parser.add_argument(
+            '--missing-only',
+            action='store_true',
+            help='Only render images that have no derivatives yet',
+        )
+
+    def handle(self, *args, **options):
+        queryset = ProductImage.objects.exclude(image='').order_by('pk')
+        if options['missing_only']:
+            queryset = queryset.filter(derivatives={})
+
+        started = time.monotonic()
+        rendered = failed = 0
+        last_pk = 0
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=options['workers'], mp_context=context) as pool:
+            while True:
+                chunk = list(
+                    queryset.filter(pk__gt=last_pk).values_list('pk', 'image', 'product_id')[:options['chunk_size']]
+                )
+                if not chunk:
+                    break
+                last_pk = chunk[-1][0]
+
+                futures = [(pk, product_id, pool.submit(generate_derivatives, name)) for pk, name, product_id in chunk]
+                updated = []
+                for pk, product_id, future in futures:
+                    try:
+                        derivatives = future.result()
+                    except Exception as exc:
+                        failed += 1
+                        self.stderr.write(f'Image {pk}: {exc}')
+                        continue
+                    image = ProductImage(pk=pk, product_id=product_id, derivatives=derivatives)
+                    image.thumbnail.name = derivatives['card.jpg']
+                    updated.append(image)
+
+                with transaction.atomic():
+                    ProductImage.objects.bulk_update(updated, ['derivatives', 'thumbnail'])
+                    # Cached product cards embed the image URL
+                    Product.objects.filter(
+                        pk__in={image.product_id for image in updated}
+                    ).update(updated_at=timezone.now())
+                rendered += len(updated)
+                self.stdout.write(f'Rendered {rendered} images')
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered derivatives for {rendered} images in {elapsed:.1f}s ({failed} failed)'
+        ))
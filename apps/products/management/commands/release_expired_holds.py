@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.products.models import StockHold
+
+
+class Command(BaseCommand):
+    help = 'Delete expired checkout stock holds in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Holds deleted per statement (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        # Expired holds already stop counting; this only reclaims the rows
+        now = timezone.now()
+        expired = StockHold.objects.filter(expires_at__lte=now).order_by('expires_at')
+        released = 0
+        while True:
+            batch = list(expired.values_list('pk', flat=True)[:options['chunk_size']])
+            if not batch:
+                break
+            released += StockHold.objects.filter(pk__in=batch).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired holds'))
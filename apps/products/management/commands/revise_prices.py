@@ -0,0 +1,72 @@
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.products.models import Category, Manufacturer, Product
+from apps.products.pricing import PRICE_FIELDS, apply_price_revision, plan_price_revision
+
+
+def decimal_arg(value):
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValueError(value)
+
+
+class Command(BaseCommand):
+    help = 'Revise a price column across a manufacturer, category or the whole catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('field', choices=PRICE_FIELDS, help='Price column to revise')
+        parser.add_argument('--percent', type=decimal_arg, default=Decimal('0'), help='Relative change, e.g. 5 or -2.5')
+        parser.add_argument('--amount', type=decimal_arg, default=Decimal('0'), help='Absolute change applied after --percent')
+        parser.add_argument('--cap-at-mrp', action='store_true', help='Never let the price exceed the MRP')
+        parser.add_argument('--round-to', type=decimal_arg, default=Decimal('0.01'), help='Rounding step (default: 0.01)')
+        parser.add_argument('--manufacturer', help='Manufacturer slug')
+        parser.add_argument('--category', help='Category slug (includes subcategories)')
+        parser.add_argument('--include-inactive', action='store_true', help='Also revise inactive products')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Rows per bulk update (default: 500)')
+        parser.add_argument('--dry-run', action='store_true', help='Show the diff without writing anything')
+
+    def handle(self, *args, **options):
+        if not options['percent'] and not options['amount'] and not options['cap_at_mrp']:
+            raise CommandError('Nothing to do: give --percent, --amount or --cap-at-mrp')
+        if options['round_to'] <= 0:
+            raise CommandError('--round-to must be positive')
+
+        products = Product.objects.all()
+        if not options['include_inactive']:
+            products = products.filter(is_active=True)
+        if options['manufacturer']:
+            manufacturer = Manufacturer.objects.filter(slug=options['manufacturer']).first()
+            if manufacturer is None:
+                raise CommandError(f"No manufacturer with slug {options['manufacturer']!r}")
+            products = products.filter(manufacturer=manufacturer)
+        if options['category']:
+            category = Category.objects.filter(slug=options['category']).first()
+            if category is None:
+                raise CommandError(f"No category with slug {options['category']!r}")
+            products = products.filter(category__in=Category.subtree_filter(category.path))
+
+        field = options['field']
+        # Materialized so the writes never race the read cursor
+        changes = list(plan_price_revision(
+            products, field,
+            percent=options['percent'],
+            amount=options['amount'],
+            cap_at_mrp=options['cap_at_mrp'],
+            round_to=options['round_to'],
+        ))
+
+        if options['dry_run'] or options['verbosity'] > 1:
+            for pk, name, old, new in changes:
+                self.stdout.write(f'{pk:>8}  {name[:50]:<50}  {old:>10} -> {new:>10}  ({new - old:+})')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Dry run: {len(changes)} {field} values would change'))
+            return
+
+        updated, skipped = apply_price_revision(changes, field, chunk_size=options['chunk_size'])
+        for pk, name, old, _new in skipped:
+            self.stderr.write(f'Skipped {pk} {name[:50]}: {field} changed from {old} since it was read')
+        self.stdout.write(self.style.SUCCESS(f'Updated {field} on {updated} products, {len(skipped)} skipped'))
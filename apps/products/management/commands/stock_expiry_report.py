@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from apps.products import reports
+
+
+class Command(BaseCommand):
+    help = 'Write expired, near-expiry and idle stock lots as CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=reports.DEFAULT_EXPIRY_DAYS,
+            help=f'Report lots expiring within this many days (default: {reports.DEFAULT_EXPIRY_DAYS})',
+        )
+        parser.add_argument(
+            '--idle-days',
+            type=int,
+            default=reports.DEFAULT_IDLE_DAYS,
+            help=f'Report lots with no movement for this many days (default: {reports.DEFAULT_IDLE_DAYS})',
+        )
+        parser.add_argument(
+            '--output',
+            help='CSV file to write (default: standard output)',
+        )
+
+    def handle(self, *args, **options):
+        rows = reports.expiry_report_rows(options['days'], options['idle_days'])
+        if not options['output']:
+            for chunk in reports.stream_csv(rows):
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(options['output'], 'w', newline='', encoding='utf-8') as report:
+            report.writelines(reports.stream_csv(rows))
+        self.stdout.write(self.style.SUCCESS(f'Wrote {options["output"]}'))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:00
+
+from django.db import migrations, models
+
+
+def build_category_paths(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+    paths = {}
+
+    def build(pk):
+        if pk not in paths:
+            parent_id = parents[pk]
+            paths[pk] = (build(parent_id) if parent_id else '/') + f"{pk}/"
+        return paths[pk]
+
+    categories = list(Category.objects.only('id', 'path'))
+    for category in categories:
+        category.path = build(category.id)
+    Category.objects.bulk_update(categories, ['path'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(build_category_paths, migrations.RunPython.noop),
+    ]
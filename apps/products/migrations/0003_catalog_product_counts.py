@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:01
+
+from django.db import migrations, models
+
+
+def backfill_product_counts(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    Manufacturer = apps.get_model('products', 'Manufacturer')
+    Product = apps.get_model('products', 'Product')
+    active = Product.objects.filter(is_active=True).order_by()
+
+    by_manufacturer = dict(active.values_list('manufacturer_id').annotate(total=models.Count('id')))
+    manufacturers = list(Manufacturer.objects.only('id'))
+    for manufacturer in manufacturers:
+        manufacturer.product_count = by_manufacturer.get(manufacturer.id, 0)
+    Manufacturer.objects.bulk_update(manufacturers, ['product_count'], batch_size=500)
+
+    direct = dict(active.values_list('category_id').annotate(total=models.Count('id')))
+    categories = list(Category.objects.only('id', 'parent_id', 'path', 'is_active'))
+    totals = {category.id: direct.get(category.id, 0) for category in categories}
+    for category in sorted(categories, key=lambda c: c.path.count('/'), reverse=True):
+        if category.parent_id and category.is_active:
+            totals[category.parent_id] += totals[category.id]
+    for category in categories:
+        category.product_count = totals[category.id]
+    Category.objects.bulk_update(categories, ['product_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_category_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='manufacturer',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_product_counts, migrations.RunPython.noop),
+    ]
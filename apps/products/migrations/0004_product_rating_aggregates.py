@@ -0,0 +1,45 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:02
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce, Round
+
+
+def backfill_ratings(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductReview = apps.get_model('products', 'ProductReview')
+    approved = ProductReview.objects.filter(
+        product=models.OuterRef('pk'),
+        is_approved=True
+    ).order_by().values('product')
+    Product.objects.update(
+        rating_avg=Coalesce(
+            models.Subquery(approved.annotate(avg=Round(models.Avg('rating'), 1)).values('avg')),
+            0,
+            output_field=models.DecimalField(max_digits=2, decimal_places=1)
+        ),
+        rating_count=Coalesce(
+            models.Subquery(approved.annotate(total=models.Count('id')).values('total')),
+            0
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_catalog_product_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.DecimalField(decimal_places=1, default=0, editable=False, max_digits=2),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:03
+
+import apps.products.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("""
+        CREATE VIRTUAL TABLE products_product_fts USING fts5(
+            name, composition, description, manufacturer, category,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    """)
+    # Persist the ranking so the hidden `rank` column weights name matches highest
+    schema_editor.execute(
+        "INSERT INTO products_product_fts (products_product_fts, rank) "
+        "VALUES ('rank', 'bm25(10.0, 5.0, 1.0, 4.0, 2.0)')"
+    )
+    schema_editor.execute("""
+        INSERT INTO products_product_fts (rowid, name, composition, description, manufacturer, category)
+        SELECT p.id, p.name, p.composition, p.description, m.name, c.name
+        FROM products_product p
+        INNER JOIN products_manufacturer m ON m.id = p.manufacturer_id
+        INNER JOIN products_category c ON c.id = p.category_id
+    """)
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS products_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchIndex',
+            fields=[
+                ('product', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='products.product')),
+                ('document', apps.products.models.SearchDocumentField(db_column='products_product_fts')),
+                ('rank', models.FloatField()),
+                ('name', models.TextField()),
+                ('composition', models.TextField()),
+                ('description', models.TextField()),
+                ('manufacturer', models.TextField()),
+                ('category', models.TextField()),
+            ],
+            options={
+                'db_table': 'products_product_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['pharmacy_price', 'id'], name='product_pharmacy_price_keyset'),
+        ),
+    ]
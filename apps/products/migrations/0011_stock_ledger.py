@@ -0,0 +1,59 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Sum, Window
+
+
+def backfill_running_balances(apps, schema_editor):
+    Stock = apps.get_model('products', 'Stock')
+    running = Stock.objects.annotate(
+        running=Window(Sum('quantity'), partition_by=[F('product_id')], order_by=F('id').asc())
+    ).values_list('id', 'running')
+    movements = [Stock(id=pk, balance_after=balance) for pk, balance in running]
+    Stock.objects.bulk_update(movements, ['balance_after'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_product_affinity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_movement', models.PositiveBigIntegerField(default=0)),
+                ('balance', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Stock Snapshot',
+                'verbose_name_plural': 'Stock Snapshots',
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='balance_after',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['product', 'id'], name='stock_product_ledger'),
+        ),
+        migrations.AddField(
+            model_name='stocksnapshot',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='products.product'),
+        ),
+        migrations.AddIndex(
+            model_name='stocksnapshot',
+            index=models.Index(fields=['product', '-id'], name='stock_snapshot_latest'),
+        ),
+        migrations.RunPython(backfill_running_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, Q, Sum
+
+
+def backfill_lots(apps, schema_editor):
+    """One lot per batch received so far. Sales never recorded a lot, so
+    each product's current stock is assumed to sit in its latest-expiring
+    lots, as FEFO would have left it."""
+    Product = apps.get_model('products', 'Product')
+    Stock = apps.get_model('products', 'Stock')
+    StockLot = apps.get_model('products', 'StockLot')
+    receipts = Stock.objects.filter(quantity__gt=0).filter(
+        ~Q(batch_number='') | Q(expiry_date__isnull=False)
+    ).order_by('product_id', F('expiry_date').desc(nulls_first=True)).values(
+        'product_id', 'batch_number', 'expiry_date'
+    ).annotate(received=Sum('quantity'))
+    stock = dict(Product.objects.values_list('pk', 'stock_quantity'))
+
+    for receipt in receipts:
+        on_hand = min(receipt['received'], stock.get(receipt['product_id'], 0))
+        stock[receipt['product_id']] = stock.get(receipt['product_id'], 0) - on_hand
+        lot = StockLot.objects.create(
+            product_id=receipt['product_id'],
+            batch_number=receipt['batch_number'],
+            expiry_date=receipt['expiry_date'],
+            quantity=on_hand,
+        )
+        Stock.objects.filter(
+            product_id=lot.product_id, batch_number=lot.batch_number, expiry_date=lot.expiry_date, quantity__gt=0
+        ).update(lot=lot)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='reference',
+            field=models.CharField(blank=True, db_index=True, max_length=50),
+        ),
+        migrations.CreateModel(
+            name='StockLot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('batch_number', models.CharField(blank=True, max_length=50)),
+                ('expiry_date', models.DateField(blank=True, null=True)),
+                ('quantity', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lots', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Stock Lot',
+                'verbose_name_plural': 'Stock Lots',
+                'ordering': ['expiry_date', 'id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='lot',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movements', to='products.stocklot'),
+        ),
+        migrations.AddIndex(
+            model_name='stocklot',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['product', 'expiry_date'], name='stock_lot_fefo'),
+        ),
+        migrations.AddConstraint(
+            model_name='stocklot',
+            constraint=models.UniqueConstraint(fields=('product', 'batch_number', 'expiry_date'), name='stock_lot_batch'),
+        ),
+        migrations.RunPython(backfill_lots, migrations.RunPython.noop),
+    ]
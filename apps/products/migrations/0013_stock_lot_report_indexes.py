@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:29
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+def date_lots_by_last_movement(apps, schema_editor):
+    """Backfilled lots were all stamped with the migration time"""
+    Stock = apps.get_model('products', 'Stock')
+    StockLot = apps.get_model('products', 'StockLot')
+    last_movement = Stock.objects.filter(lot=OuterRef('pk')).order_by().values('lot').annotate(
+        last=Max('created_at')
+    ).values('last')[:1]
+    StockLot.objects.filter(pk__in=Stock.objects.filter(lot__isnull=False).values('lot')).update(
+        updated_at=Subquery(last_movement)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_stock_lots'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stocklot',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['expiry_date'], name='stock_lot_expiry'),
+        ),
+        migrations.AddIndex(
+            model_name='stocklot',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['updated_at'], name='stock_lot_idle'),
+        ),
+        migrations.RunPython(date_lots_by_last_movement, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_stock_lot_report_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64)),
+                ('quantity', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Stock Hold',
+                'verbose_name_plural': 'Stock Holds',
+                'ordering': ['expires_at'],
+                'indexes': [models.Index(fields=['product', 'expires_at'], name='stock_hold_active'), models.Index(fields=['expires_at'], name='stock_hold_expiry'), models.Index(fields=['key'], name='stock_hold_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_stock_holds'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock_quantity__lte', models.F('low_stock_threshold')), ('track_inventory', True)), fields=['manufacturer', 'stock_quantity'], name='product_low_stock'),
+        ),
+    ]
@@ -1,12 +1,23 @@
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models.functions import Cast, Coalesce, Concat, Greatest, Round, Substr
+from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.text import slugify
 from django.urls import reverse
 from apps.core.models import TimeStampedModel
+from .images import (
+    DERIVATIVE_FORMATS, DERIVATIVE_SIZES, generate_derivatives, get_pool, image_url, store_image,
+)
+import logging
 import uuid
+from decimal import Decimal
+from functools import partial
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
 class Category(TimeStampedModel):
     """Product categories with hierarchical support"""
@@ -25,6 +36,10 @@ class Category(TimeStampedModel):
     icon = models.CharField(max_length=50, blank=True)  # FontAwesome icon class
     is_active = models.BooleanField(default=True)
     sort_order = models.PositiveIntegerField(default=0)
+    # Materialized path of ancestor ids, e.g. "/1/5/12/"
+    path = models.CharField(max_length=255, blank=True, db_index=True, editable=False)
+    # Active products in this category and its active subcategories
+    product_count = models.PositiveIntegerField(default=0, editable=False)
     
     class Meta:
         verbose_name = "Category"
@@ -36,30 +51,135 @@ class Category(TimeStampedModel):
             return f"{self.parent.name} > {self.name}"
         return self.name
     
+    def clean(self):
+        if self.pk and self.parent_id:
+            parent_path = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).first() or ''
+            if f"/{self.pk}/" in parent_path or self.parent_id == self.pk:
+                raise ValidationError({'parent': 'A category cannot be moved under itself or one of its subcategories.'})
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        
+        old = None
+        if self.pk:
+            old = Category.objects.filter(pk=self.pk).values(
+                'path', 'parent_id', 'is_active', 'product_count'
+            ).first()
+        old_path = old['path'] if old else ''
+        if old:
+            # The counter is maintained with F() updates, never from a stale instance
+            self.product_count = old['product_count']
+        
         super().save(*args, **kwargs)
+        
+        # Move this subtree's products between ancestor counters on re-parent/(de)activation
+        if old and (old['parent_id'], old['is_active']) != (self.parent_id, self.is_active):
+            if old['parent_id'] and old['is_active']:
+                Category.adjust_product_count(old['parent_id'], -self.product_count)
+            if self.parent_id and self.is_active:
+                Category.adjust_product_count(self.parent_id, self.product_count)
+        
+        # Keep the materialized path (and the whole subtree on re-parent) in sync
+        parent_path = '/'
+        if self.parent_id:
+            parent_path = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).first() or '/'
+        new_path = f"{parent_path}{self.pk}/"
+        if new_path != old_path:
+            Category.objects.filter(pk=self.pk).update(path=new_path)
+            if old_path:
+                Category.subtree_filter(old_path).exclude(pk=self.pk).update(
+                    path=Concat(models.Value(new_path), Substr('path', len(old_path) + 1),
+                                output_field=models.CharField())
+                )
+        self.path = new_path
     
     def get_absolute_url(self):
         return reverse('products:category_products', kwargs={'slug': self.slug})
     
+    @staticmethod
+    def subtree_filter(path):
+        """Categories whose path starts with `path`, as an indexed range scan.
+        
+        Paths only contain digits and '/', and '0' sorts right after '/', so
+        [path, path[:-1] + '0') covers exactly the subtree.
+        """
+        return Category.objects.filter(path__gte=path, path__lt=path[:-1] + '0')
+    
+    def get_descendants(self, include_self=False):
+        """Get active descendant categories with a single query"""
+        if not self.path:
+            return [self] if include_self else []
+        nodes = list(self.subtree_filter(self.path).exclude(pk=self.pk).order_by('path'))
+        # Drop inactive categories along with everything beneath them
+        hidden = [node.path for node in nodes if not node.is_active]
+        descendants = [
+            node for node in nodes
+            if not any(node.path.startswith(p) for p in hidden)
+        ]
+        if include_self:
+            descendants.insert(0, self)
+        return descendants
+    
     @property
     def get_all_children(self):
         """Get all descendant categories"""
-        children = []
-        for child in self.children.filter(is_active=True):
-            children.append(child)
-            children.extend(child.get_all_children)
-        return children
+        return self.get_descendants()
     
-    @property
-    def product_count(self):
-        """Get total product count including subcategories"""
-        count = self.products.filter(is_active=True).count()
-        for child in self.get_all_children:
-            count += child.products.filter(is_active=True).count()
-        return count
+    
+    @classmethod
+    def rebuild_paths(cls):
+        """Recompute every materialized path from the parent links"""
+        parents = dict(cls.objects.values_list('id', 'parent_id'))
+        paths = {}
+        
+        def build(pk):
+            if pk not in paths:
+                parent_id = parents[pk]
+                paths[pk] = (build(parent_id) if parent_id else '/') + f"{pk}/"
+            return paths[pk]
+        
+        categories = list(cls.objects.only('id', 'path'))
+        for category in categories:
+            category.path = build(category.id)
+        cls.objects.bulk_update(categories, ['path'], batch_size=500)
+    
+    @classmethod
+    def adjust_product_count(cls, category_id, delta):
+        """Apply `delta` to a category and every ancestor whose count includes it"""
+        if not delta:
+            return
+        path = cls.objects.filter(pk=category_id).values_list('path', flat=True).first()
+        if not path:
+            return
+        ids = [int(pk) for pk in path.strip('/').split('/')]
+        active = dict(cls.objects.filter(pk__in=ids).values_list('id', 'is_active'))
+        # An inactive category hides its subtree from everything above it
+        reached = []
+        for pk in reversed(ids):
+            reached.append(pk)
+            if not active.get(pk):
+                break
+        cls.objects.filter(pk__in=reached).update(product_count=models.F('product_count') + delta)
+    
+    @classmethod
+    def rebuild_product_counts(cls):
+        """Recompute every category counter from the products table"""
+        direct = dict(
+            Product.objects.filter(is_active=True)
+            .values_list('category_id')
+            .annotate(total=models.Count('id'))
+            .order_by()
+        )
+        categories = list(cls.objects.only('id', 'parent_id', 'path', 'is_active', 'product_count'))
+        totals = {category.id: direct.get(category.id, 0) for category in categories}
+        # Deepest categories first so each subtree is complete before it is rolled up
+        for category in sorted(categories, key=lambda c: c.path.count('/'), reverse=True):
+            if category.parent_id and category.is_active:
+                totals[category.parent_id] += totals[category.id]
+        for category in categories:
+            category.product_count = totals[category.id]
+        cls.objects.bulk_update(categories, ['product_count'], batch_size=500)
 
 class Manufacturer(TimeStampedModel):
     """Product manufacturers/brands"""
@@ -71,6 +191,8 @@ class Manufacturer(TimeStampedModel):
     website_url = models.URLField(blank=True)
     contact_email = models.EmailField(blank=True)
     is_active = models.BooleanField(default=True)
+    # Active products from this manufacturer
+    product_count = models.PositiveIntegerField(default=0, editable=False)
     
     class Meta:
         verbose_name = "Manufacturer"
@@ -83,14 +205,73 @@ class Manufacturer(TimeStampedModel):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        if self.pk:
+            # The counter is maintained with F() updates, never from a stale instance
+            stored = Manufacturer.objects.filter(pk=self.pk).values_list('product_count', flat=True).first()
+            if stored is not None:
+                self.product_count = stored
         super().save(*args, **kwargs)
     
     def get_absolute_url(self):
         return reverse('products:manufacturer_products', kwargs={'slug': self.slug})
     
-    @property
-    def product_count(self):
-        return self.products.filter(is_active=True).count()
+    @classmethod
+    def adjust_product_count(cls, manufacturer_id, delta):
+        if delta:
+            cls.objects.filter(pk=manufacturer_id).update(product_count=models.F('product_count') + delta)
+    
+    @classmethod
+    def rebuild_product_counts(cls):
+        """Recompute every manufacturer counter in a single UPDATE"""
+        active_products = Product.objects.filter(
+            manufacturer=models.OuterRef('pk'),
+            is_active=True
+        ).order_by().values('manufacturer').annotate(total=models.Count('id')).values('total')
+        cls.objects.update(product_count=Coalesce(models.Subquery(active_products), 0))
+
+class ProductQuerySet(models.QuerySet):
+    # Columns read by product cards, listing JSON and the keyset sorts;
+    # description, composition and the SEO text stay in the database
+    LISTING_FIELDS = (
+        'name', 'slug', 'category', 'manufacturer', 'pack_size', 'prescription_required',
+        'mrp_price', 'patient_price', 'pharmacy_price',
+        'stock_quantity', 'low_stock_threshold', 'track_inventory',
+        'is_active', 'view_count', 'rating_avg', 'rating_count', 'created_at', 'updated_at',
+        'category__name', 'category__slug', 'manufacturer__name', 'manufacturer__slug',
+    )
+    
+    def for_listing(self):
+        """Card-sized rows, with the primary image (minus any base64 payload)
+        fetched in one extra query per page"""
+        return self.select_related('category', 'manufacturer').only(*self.LISTING_FIELDS).prefetch_related(
+            models.Prefetch(
+                'images',
+                queryset=ProductImage.objects.filter(is_primary=True).defer('image_data', 'thumbnail_data'),
+                to_attr='primary_images'
+            )
+        )
+    
+    def low_stock(self):
+        """Products at or below their low_stock_threshold; the filter repeats
+        the condition of the partial index product_low_stock so it is used"""
+        return self.filter(track_inventory=True, stock_quantity__lte=models.F('low_stock_threshold'))
+    
+    def with_user_pricing(self, user):
+        """Annotate `user_price` and `discount_percentage` for `user` in SQL"""
+        price = models.F(Product.price_field_for_user(user))
+        # Float division: SQLite keeps whole-number decimals as integers
+        mrp = Cast('mrp_price', models.FloatField())
+        return self.annotate(
+            user_price=price,
+            discount_percentage=models.Case(
+                models.When(
+                    mrp_price__gt=0,
+                    then=Round((mrp - Cast(price, models.FloatField())) * 100 / mrp, 1)
+                ),
+                default=models.Value(0.0),
+                output_field=models.FloatField()
+            )
+        )
 
 class Product(TimeStampedModel):
     """Main product model"""
@@ -143,10 +324,31 @@ class Product(TimeStampedModel):
     # Analytics
     view_count = models.PositiveIntegerField(default=0)
     
+    # Approved review aggregates, maintained by ProductReview changes
+    rating_avg = models.DecimalField(max_digits=2, decimal_places=1, default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    
+    objects = ProductQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Product"
         verbose_name_plural = "Products"
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination: every catalog sort column plus the id tiebreak
+            models.Index(fields=['created_at', 'id'], name='product_created_keyset'),
+            models.Index(fields=['name', 'id'], name='product_name_keyset'),
+            models.Index(fields=['patient_price', 'id'], name='product_price_keyset'),
+            models.Index(fields=['pharmacy_price', 'id'], name='product_pharmacy_price_keyset'),
+            models.Index(fields=['view_count', 'id'], name='product_views_keyset'),
+            # Only products at or below their threshold are in it, already
+            # grouped by manufacturer for the digest (see low_stock())
+            models.Index(
+                fields=['manufacturer', 'stock_quantity'],
+                name='product_low_stock',
+                condition=models.Q(track_inventory=True, stock_quantity__lte=models.F('low_stock_threshold')),
+            ),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.manufacturer.name}"
@@ -159,16 +361,48 @@ class Product(TimeStampedModel):
         if not self.short_description and self.description:
             self.short_description = self.description[:500]
         
+        update_fields = kwargs.get('update_fields')
+        tracks_counters = update_fields is None or {'category', 'manufacturer', 'is_active'} & set(update_fields)
+        old = None
+        if self.pk and tracks_counters:
+            old = Product.objects.filter(pk=self.pk).values(
+                'category_id', 'manufacturer_id', 'is_active'
+            ).first()
+        
         super().save(*args, **kwargs)
+        
+        if tracks_counters:
+            self.update_catalog_counters(old)
+    
+    def update_catalog_counters(self, old=None):
+        """Move this product between category/manufacturer counters"""
+        new = {
+            'category_id': self.category_id,
+            'manufacturer_id': self.manufacturer_id,
+            'is_active': self.is_active,
+        }
+        if old == new:
+            return
+        if old and old['is_active']:
+            Category.adjust_product_count(old['category_id'], -1)
+            Manufacturer.adjust_product_count(old['manufacturer_id'], -1)
+        if self.is_active:
+            Category.adjust_product_count(self.category_id, 1)
+            Manufacturer.adjust_product_count(self.manufacturer_id, 1)
     
     def get_absolute_url(self):
         return reverse('products:product_detail', kwargs={'slug': self.slug})
     
+    @staticmethod
+    def price_field_for_user(user):
+        """Name of the price column that applies to `user`"""
+        if user and user.is_authenticated and user.user_type == 'PHARMACY':
+            return 'pharmacy_price'
+        return 'patient_price'
+    
     def get_price_for_user(self, user):
         """Get price based on user type"""
-        if user and user.is_authenticated and user.user_type == 'PHARMACY':
-            return self.pharmacy_price
-        return self.patient_price
+        return getattr(self, self.price_field_for_user(user))
     
     def get_discount_percentage(self, user):
         """Calculate discount percentage"""
@@ -193,26 +427,111 @@ class Product(TimeStampedModel):
     @property
     def primary_image(self):
         """Get primary product image"""
+        if hasattr(self, 'primary_images'):
+            # Prefetched by ProductQuerySet.for_listing()
+            return self.primary_images[0] if self.primary_images else None
         return self.images.filter(is_primary=True).first()
     
+    @property
+    def card_version(self):
+        """Changes whenever anything rendered on the product card changes"""
+        return f"{self.updated_at.timestamp()}:{self.stock_quantity}:{self.rating_count}:{self.rating_avg}"
+    
     @property
     def average_rating(self):
-        """Calculate average rating"""
-        reviews = self.reviews.filter(is_approved=True)
-        if reviews.exists():
-            return round(reviews.aggregate(models.Avg('rating'))['rating__avg'], 1)
-        return 0
+        """Average approved rating"""
+        return self.rating_avg
     
     @property
     def review_count(self):
-        """Get total review count"""
-        return self.reviews.filter(is_approved=True).count()
+        """Approved review count"""
+        return self.rating_count
+    
+    def refresh_rating(self):
+        """Recompute the stored rating aggregates for this product"""
+        stats = self.reviews.filter(is_approved=True).aggregate(
+            avg=models.Avg('rating'),
+            count=models.Count('id')
+        )
+        self.rating_avg = round(Decimal(stats['avg'] or 0), 1)
+        self.rating_count = stats['count']
+        # updated_at moves too, so review edits retire cached detail pages
+        Product.objects.filter(pk=self.pk).update(
+            rating_avg=self.rating_avg,
+            rating_count=self.rating_count,
+            updated_at=timezone.now()
+        )
+    
+    @classmethod
+    def rebuild_ratings(cls, queryset=None):
+        """Recompute rating aggregates for many products in one UPDATE"""
+        approved = ProductReview.objects.filter(
+            product=models.OuterRef('pk'),
+            is_approved=True
+        ).order_by().values('product')
+        queryset = cls.objects.all() if queryset is None else queryset
+        return queryset.update(
+            rating_avg=Coalesce(
+                models.Subquery(approved.annotate(avg=Round(models.Avg('rating'), 1)).values('avg')),
+                0,
+                output_field=models.DecimalField(max_digits=2, decimal_places=1)
+            ),
+            rating_count=Coalesce(
+                models.Subquery(approved.annotate(total=models.Count('id')).values('total')),
+                0
+            )
+        )
+
+class SearchDocumentField(models.TextField):
+    """An FTS5 table's hidden column of the same name, queried with __match"""
+
+
+@SearchDocumentField.register_lookup
+class FullTextMatch(models.Lookup):
+    lookup_name = 'match'
+    
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", lhs_params + rhs_params
+
+class ProductSearchIndex(models.Model):
+    """SQLite FTS5 full-text index over product text, keyed by product id
+    
+    The virtual table is created by migration 0005 and kept in sync by
+    apps.products.search; `rank` is bm25 with name weighted highest.
+    """
+    
+    product = models.OneToOneField(
+        Product,
+        primary_key=True,
+        db_column='rowid',
+        on_delete=models.DO_NOTHING,
+        related_name='search_index'
+    )
+    document = SearchDocumentField(db_column='products_product_fts')
+    rank = models.FloatField()
+    name = models.TextField()
+    composition = models.TextField()
+    description = models.TextField()
+    manufacturer = models.TextField()
+    category = models.TextField()
+    
+    class Meta:
+        managed = False
+        db_table = 'products_product_fts'
 
 class ProductImage(TimeStampedModel):
     """Product images"""
     
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
-    image_data = models.TextField()  # Base64 encoded image
+    # Content-addressed files (see images.py); the base64 columns are legacy
+    # and are emptied by the migrate_product_images command
+    image = models.FileField(max_length=255, blank=True, editable=False)
+    thumbnail = models.FileField(max_length=255, blank=True, editable=False)
+    # Rendered sizes: {"<size>.<ext>": storage name}, e.g. "card.webp"
+    derivatives = models.JSONField(default=dict, blank=True, editable=False)
+    image_data = models.TextField(blank=True)  # Base64 encoded image
     thumbnail_data = models.TextField(blank=True)  # Base64 encoded thumbnail
     alt_text = models.CharField(max_length=255, blank=True)
     is_primary = models.BooleanField(default=False)
@@ -226,6 +545,77 @@ class ProductImage(TimeStampedModel):
     def __str__(self):
         return f"{self.product.name} - Image {self.id}"
     
+    @property
+    def url(self):
+        """Image URL; rows not yet moved to file storage fall back to a data URI"""
+        if self.image:
+            return image_url(self.image.name)
+        if self.image_data:
+            return f"data:image/jpeg;base64,{self.image_data}"
+        return ''
+    
+    @property
+    def thumbnail_url(self):
+        """Thumbnail URL, falling back to the full image"""
+        if self.thumbnail:
+            return image_url(self.thumbnail.name)
+        if self.thumbnail_data and not self.image:
+            return f"data:image/jpeg;base64,{self.thumbnail_data}"
+        return self.url
+    
+    @cached_property
+    def variants(self):
+        """URL per derived size and format, e.g. variants.card.webp, falling
+        back to the original until the derivatives exist"""
+        return {
+            size: {
+                ext: image_url(self.derivatives[f"{size}.{ext}"])
+                if f"{size}.{ext}" in self.derivatives else self.url
+                for ext in DERIVATIVE_FORMATS
+            }
+            for size in DERIVATIVE_SIZES
+        }
+    
+    def set_image(self, content):
+        """Store image bytes as a content-addressed file; derivatives are
+        rendered again after the save"""
+        self.image.name = store_image(content)
+        self.image_data = ''
+        self.thumbnail.name = ''
+        self.derivatives = {}
+    
+    def schedule_derivatives(self):
+        """Render the derivatives in the image process pool once this save commits"""
+        pk, source = self.pk, self.image.name
+        
+        def submit():
+            future = get_pool().submit(generate_derivatives, source)
+            future.add_done_callback(partial(ProductImage._derivatives_done, pk, source))
+        
+        transaction.on_commit(submit)
+    
+    @classmethod
+    def _derivatives_done(cls, pk, source, future):
+        # Runs on the pool's result thread, which has its own connection
+        try:
+            cls.store_derivatives(pk, source, future.result())
+        except Exception:
+            logger.exception("Rendering derivatives for product image %s failed", pk)
+        finally:
+            connections.close_all()
+    
+    @classmethod
+    def store_derivatives(cls, pk, source, derivatives):
+        """Record rendered derivatives unless the original was replaced meanwhile"""
+        updated = cls.objects.filter(pk=pk, image=source).update(
+            derivatives=derivatives,
+            thumbnail=derivatives['card.jpg'],
+        )
+        if updated:
+            # Cached product cards embed the image URL
+            Product.objects.filter(images__pk=pk).update(updated_at=timezone.now())
+        return updated
+    
     def save(self, *args, **kwargs):
         # Ensure only one primary image per product
         if self.is_primary:
@@ -264,6 +654,41 @@ class ProductReview(TimeStampedModel):
     def __str__(self):
         return f"{self.product.name} - {self.user.email} ({self.rating} stars)"
 
+class StockLot(TimeStampedModel):
+    """Stock on hand per batch. Receipts tagged with a batch or expiry feed
+    a lot; order allocation draws lots down first-expiry-first-out"""
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='lots')
+    batch_number = models.CharField(max_length=50, blank=True)
+    expiry_date = models.DateField(blank=True, null=True)
+    quantity = models.IntegerField(default=0)  # On hand
+    # updated_at doubles as the time of the lot's last movement
+    
+    class Meta:
+        verbose_name = "Stock Lot"
+        verbose_name_plural = "Stock Lots"
+        ordering = ['expiry_date', 'id']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'batch_number', 'expiry_date'], name='stock_lot_batch'),
+        ]
+        indexes = [
+            # FEFO lookups only ever want lots with stock; depleted lots
+            # drop out of the index, so they never slow allocation down
+            models.Index(
+                fields=['product', 'expiry_date'], name='stock_lot_fefo', condition=models.Q(quantity__gt=0)
+            ),
+            # Expiry and dead-stock reports: date ranges across all products
+            models.Index(fields=['expiry_date'], name='stock_lot_expiry', condition=models.Q(quantity__gt=0)),
+            models.Index(fields=['updated_at'], name='stock_lot_idle', condition=models.Q(quantity__gt=0)),
+        ]
+    
+    def __str__(self):
+        return f"{self.product.name} - {self.batch_number or 'no batch'} ({self.quantity})"
+    
+    @property
+    def is_expired(self):
+        return self.expiry_date is not None and self.expiry_date <= timezone.localdate()
+
 class Stock(TimeStampedModel):
     """Stock tracking model"""
     
@@ -283,22 +708,165 @@ class Stock(TimeStampedModel):
     cost_price_per_unit = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     notes = models.TextField(blank=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    # Product stock right after this movement was applied (ledger running balance)
+    balance_after = models.IntegerField(null=True, blank=True, editable=False)
+    lot = models.ForeignKey(
+        StockLot, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='movements'
+    )
+    reference = models.CharField(max_length=50, blank=True, db_index=True)  # e.g. order number
     
     class Meta:
         verbose_name = "Stock Movement"
         verbose_name_plural = "Stock Movements"
         ordering = ['-created_at']
+        indexes = [
+            # Ledger replay after a snapshot: product's movements past an id
+            models.Index(fields=['product', 'id'], name='stock_product_ledger'),
+        ]
     
     def __str__(self):
         return f"{self.product.name} - {self.movement_type} ({self.quantity})"
     
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Update product stock quantity
-        self.product.stock_quantity = self.product.stock_movements.aggregate(
-            total=models.Sum('quantity')
-        )['total'] or 0
-        self.product.save(update_fields=['stock_quantity'])
+        from .inventory import trim_lots
+        
+        # Apply only this movement's delta; edits apply the difference
+        previous = None
+        if self.pk:
+            previous = Stock.objects.filter(pk=self.pk).values('product_id', 'quantity', 'lot_id').first()
+        moved = previous is not None and previous['product_id'] != self.product_id
+        
+        with transaction.atomic():
+            delta = self.quantity
+            if moved:
+                # Reassigned to another product: the old one gives the whole
+                # movement back (clamped, like a delete) and the new one gets it
+                Product.objects.filter(pk=previous['product_id']).update(
+                    stock_quantity=Greatest(models.F('stock_quantity') - previous['quantity'], models.Value(0))
+                )
+                if previous['lot_id']:
+                    StockLot.objects.filter(pk=previous['lot_id']).update(
+                        quantity=Greatest(models.F('quantity') - previous['quantity'], models.Value(0)),
+                        updated_at=timezone.now()
+                    )
+                elif previous['quantity'] > 0:
+                    trim_lots(previous['product_id'], previous['quantity'])
+                self.lot = None
+            elif previous is not None:
+                delta -= previous['quantity']
+            
+            # The UPDATE takes the row lock, so the balance read back is this movement's
+            Product.objects.filter(pk=self.product_id).update(
+                stock_quantity=models.F('stock_quantity') + delta
+            )
+            if self.lot_id is None and (self._state.adding or moved) and (self.batch_number or self.expiry_date):
+                if self.quantity > 0:
+                    self.lot, _ = StockLot.objects.get_or_create(
+                        product_id=self.product_id, batch_number=self.batch_number, expiry_date=self.expiry_date
+                    )
+                elif self.quantity < 0:
+                    # Stock out of a named batch comes out of that lot
+                    lots = StockLot.objects.filter(product_id=self.product_id, batch_number=self.batch_number)
+                    if self.expiry_date:
+                        lots = lots.filter(expiry_date=self.expiry_date)
+                    self.lot = lots.order_by('expiry_date', 'id').first()
+            if self.lot_id and delta:
+                # Clamped: a lot never holds less than nothing
+                StockLot.objects.filter(pk=self.lot_id).update(
+                    quantity=Greatest(models.F('quantity') + delta, models.Value(0)), updated_at=timezone.now()
+                )
+            elif delta < 0:
+                # No lot named: lots give up stock they no longer have
+                # on hand, soonest expiry first, like imports do
+                trim_lots(self.product_id, -delta)
+            if previous is not None and (delta or moved):
+                # Snapshots that counted this movement no longer describe
+                # either ledger, as when a movement is deleted
+                StockSnapshot.objects.filter(
+                    product_id__in={previous['product_id'], self.product_id}, last_movement__gte=self.pk
+                ).delete()
+            balance = Product.objects.filter(pk=self.product_id).values_list('stock_quantity', flat=True).get()
+            # A running balance describes the ledger when the movement was
+            # recorded; later edits leave it as it was
+            if self._state.adding:
+                self.balance_after = balance
+            super().save(*args, **kwargs)
+        
+        # Keep an already-loaded product instance in step
+        if 'product' in self._state.fields_cache:
+            self.product.stock_quantity = balance
+    
+    @classmethod
+    def ledger_delta(cls, product_ref, after_id):
+        """Subquery: sum of the product's movements with id > `after_id`"""
+        return Coalesce(
+            models.Subquery(
+                cls.objects.filter(product=product_ref, pk__gt=after_id).order_by().values(
+                    'product'
+                ).annotate(total=models.Sum('quantity')).values('total')[:1]
+            ),
+            0
+        )
+
+class StockSnapshot(models.Model):
+    """Checkpoint of a product's ledger balance, so reconciliation only
+    replays the movements recorded after it"""
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_snapshots')
+    # Id of the last movement included in `balance` (0: none)
+    last_movement = models.PositiveBigIntegerField(default=0)
+    balance = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Stock Snapshot"
+        verbose_name_plural = "Stock Snapshots"
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['product', '-id'], name='stock_snapshot_latest'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id} @ {self.last_movement}: {self.balance}"
+
+class StockHold(models.Model):
+    """Stock set aside for a checkout in progress until `expires_at`.
+    Expired holds stop counting at once; release_expired_holds deletes them"""
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='holds')
+    key = models.CharField(max_length=64)  # Holder, e.g. "cart:42"
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Stock Hold"
+        verbose_name_plural = "Stock Holds"
+        ordering = ['expires_at']
+        indexes = [
+            # Active holds on a product (available quantity)
+            models.Index(fields=['product', 'expires_at'], name='stock_hold_active'),
+            # Sweeper
+            models.Index(fields=['expires_at'], name='stock_hold_expiry'),
+            models.Index(fields=['key'], name='stock_hold_key'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id} x{self.quantity} for {self.key}"
+
+class CacheVersion(models.Model):
+    """Named version counter for cache invalidation (see caching.py). Kept
+    in the database so every worker and management command shares it"""
+    
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField(default=1)
+    
+    class Meta:
+        verbose_name = "Cache Version"
+        verbose_name_plural = "Cache Versions"
+    
+    def __str__(self):
+        return f"{self.name}: {self.version}"
 
 class ProductTag(TimeStampedModel):
     """Product tags for better categorization"""
@@ -319,3 +887,60 @@ class ProductTag(TimeStampedModel):
         if not self.slug:
             self.slug = slugify(self.name)
         super().save(*args, **kwargs)
+
+class ProductAffinity(models.Model):
+    """Top-K "frequently bought together" neighbours per product, rebuilt
+    wholesale from order history by rebuild_product_affinities"""
+    
+    # Orders that should not count as evidence of products going together
+    EXCLUDED_ORDER_STATUSES = ['CANCELLED', 'RETURNED', 'REFUNDED']
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='affinities')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='affinity_targets')
+    score = models.PositiveIntegerField()  # Orders containing both products
+    rank = models.PositiveSmallIntegerField()
+    
+    class Meta:
+        verbose_name = "Product Affinity"
+        verbose_name_plural = "Product Affinities"
+        ordering = ['product', 'rank']
+        constraints = [
+            # Doubles as the index behind the detail page lookup
+            models.UniqueConstraint(fields=['product', 'rank'], name='product_affinity_rank'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} ({self.score})"
+    
+    @classmethod
+    def rebuild(cls, top_k=10):
+        """Recompute every product's top-K neighbours; returns rows written.
+        
+        The co-occurrence matrix is sparse, so it is computed as a self-join
+        on order items grouped by product pair, and streamed in product order.
+        """
+        from apps.orders.models import OrderItem
+        
+        pairs = OrderItem.objects.exclude(
+            order__status__in=cls.EXCLUDED_ORDER_STATUSES
+        ).annotate(
+            related_id=models.F('order__items__product')
+        ).exclude(
+            related_id=models.F('product')
+        ).values('product_id', 'related_id').annotate(
+            score=models.Count('id')
+        ).order_by('product_id', '-score', 'related_id')
+        
+        rows = []
+        current, rank = None, 0
+        for pair in pairs.iterator(chunk_size=5000):
+            if pair['product_id'] != current:
+                current, rank = pair['product_id'], 0
+            if rank < top_k:
+                rows.append(cls(rank=rank, **pair))
+                rank += 1
+        
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
@@ -0,0 +1,121 @@
+"""Keyset (cursor) pagination for product listings.
+
+A cursor encodes the last row's sort value and id, so fetching any page
+is an indexed range scan of `per_page + 1` rows no matter how deep it is.
+"""
+import base64
+import datetime
+import json
+from decimal import Decimal
+
+from django.db.models import Q
+from django.http import Http404
+
+
+def _encode_value(value):
+    # Full precision: DjangoJSONEncoder would truncate datetimes to milliseconds
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+class CursorPage:
+    def __init__(self, object_list, next_cursor, cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.cursor = cursor
+    
+    def __iter__(self):
+        return iter(self.object_list)
+    
+    def __len__(self):
+        return len(self.object_list)
+    
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+class CursorPaginator:
+    """Paginates on the queryset's first ordering term with the pk as tiebreak"""
+    
+    def __init__(self, queryset, per_page):
+        self.per_page = per_page
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        term = ordering[0] if ordering and isinstance(ordering[0], str) else '-pk'
+        self.descending = term.startswith('-')
+        self.field = term.lstrip('-')
+        if self.field in ('pk', 'id'):
+            self.queryset = queryset.order_by(term)
+        else:
+            self.queryset = queryset.order_by(term, '-pk' if self.descending else 'pk')
+    
+    def encode(self, obj):
+        key = [getattr(obj, self.field), obj.pk]
+        raw = json.dumps(key, default=_encode_value).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+    
+    def decode(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            value, pk = json.loads(raw)
+        except (ValueError, TypeError):
+            raise Http404('Invalid cursor')
+        return value, pk
+    
+    def page(self, cursor=None):
+        queryset = self.queryset
+        if cursor:
+            value, pk = self.decode(cursor)
+            op = 'lt' if self.descending else 'gt'
+            if self.field in ('pk', 'id'):
+                queryset = queryset.filter(**{f'pk__{op}': pk})
+            else:
+                queryset = queryset.filter(
+                    Q(**{f'{self.field}__{op}': value}) |
+                    Q(**{self.field: value, f'pk__{op}': pk})
+                )
+        rows = list(queryset[:self.per_page + 1])
+        next_cursor = self.encode(rows[self.per_page - 1]) if len(rows) > self.per_page else None
+        return CursorPage(rows[:self.per_page], next_cursor, cursor)
+
+
+def approximate_count(queryset, cap):
+    """Count at most `cap` rows; returns (count, is_exact)"""
+    count = queryset.order_by().values('pk')[:cap + 1].count()
+    return min(count, cap), count <= cap
+
+
+class KeysetPaginationMixin:
+    """Adds a cursor mode to a paginated ListView, enabled by `?cursor=`
+    
+    Offset pagination keeps working for requests without the parameter.
+    """
+    cursor_param = 'cursor'
+    approximate_count_cap = 1000
+    
+    def is_cursor_mode(self):
+        return self.cursor_param in self.request.GET
+    
+    def paginate_queryset(self, queryset, page_size):
+        if not self.is_cursor_mode():
+            return super().paginate_queryset(queryset, page_size)
+        page = CursorPaginator(queryset, page_size).page(self.request.GET.get(self.cursor_param))
+        return (None, page, page.object_list, False)
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = context.get('page_obj')
+        if isinstance(page, CursorPage) and page.has_next:
+            query = self.request.GET.copy()
+            query[self.cursor_param] = page.next_cursor
+            context['next_cursor_url'] = f"?{query.urlencode()}"
+        return context
+    
+    def get_result_count(self, context):
+        """Total results as (count, is_exact), reusing the paginator's count"""
+        if context.get('paginator'):
+            return context['paginator'].count, True
+        return approximate_count(self.object_list, self.approximate_count_cap)
@@ -0,0 +1,92 @@
+"""Bulk price revisions.
+
+A revision rule ("+5% pharmacy_price, capped at MRP") is evaluated for a
+whole product set while streaming its current prices; the rows whose
+rounded price changes form the diff. It is written a chunk per UPDATE,
+and only to rows still holding the price the diff was computed from, so
+an edit made in between is kept. Prices are money, so the arithmetic is
+Decimal throughout.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, Q, Value, When
+from django.utils import timezone
+
+from . import caching, suggestions
+from .models import Product
+
+PRICE_FIELDS = ['mrp_price', 'patient_price', 'pharmacy_price']
+
+CENT = Decimal('0.01')
+
+
+def round_price(value, step=CENT):
+    """Round half up to a multiple of `step` (e.g. 0.01, 0.50, 1)"""
+    step = Decimal(step)
+    return ((Decimal(value) / step).quantize(Decimal('1'), rounding=ROUND_HALF_UP) * step).quantize(CENT)
+
+
+def revised_price(price, mrp=None, percent=0, amount=0, round_to=CENT):
+    """`price` raised by `percent` then `amount`, rounded, never below zero
+    and, when `mrp` is given, never above it"""
+    revised = Decimal(price) * (1 + Decimal(str(percent)) / 100) + Decimal(str(amount))
+    revised = round_price(max(revised, Decimal('0')), round_to)
+    if mrp is not None:
+        revised = min(revised, Decimal(mrp))
+    return revised
+
+
+def plan_price_revision(queryset, field, percent=0, amount=0, cap_at_mrp=False, round_to=CENT):
+    """Yield (id, name, old, new) for every product whose price would change"""
+    if field not in PRICE_FIELDS:
+        raise ValueError(f"Unknown price field: {field}")
+    cap = cap_at_mrp and field != 'mrp_price'
+    rows = queryset.order_by('pk').values_list('pk', 'name', field, 'mrp_price')
+    for pk, name, old, mrp in rows.iterator(chunk_size=2000):
+        new = revised_price(old, mrp if cap else None, percent, amount, round_to)
+        if new != old:
+            yield pk, name, old, new
+
+
+def apply_price_revision(changes, field, chunk_size=500):
+    """Write planned changes in chunks and retire the caches that show prices.
+
+    A product whose price no longer matches the planned old value was
+    changed since the plan was made; it is left alone. Returns the number
+    of products updated and the skipped (id, name, old, new) changes.
+    """
+    changes = iter(changes)
+    updated = 0
+    skipped = []
+    with transaction.atomic():
+        while True:
+            chunk = []
+            for change in changes:
+                chunk.append(change)
+                if len(chunk) >= chunk_size:
+                    break
+            if not chunk:
+                break
+            current = set(Product.objects.select_for_update().filter(
+                reduce(or_, (Q(pk=pk, **{field: old}) for pk, _name, old, _new in chunk))
+            ).values_list('pk', flat=True))
+            skipped += [change for change in chunk if change[0] not in current]
+            if not current:
+                continue
+            # updated_at moves card_version, retiring card and detail fragments
+            updated += Product.objects.filter(pk__in=current).update(
+                updated_at=timezone.now(),
+                **{field: Case(
+                    *[When(pk=pk, then=Value(new)) for pk, _name, _old, new in chunk if pk in current],
+                    output_field=DecimalField(max_digits=10, decimal_places=2),
+                )},
+            )
+
+    if updated:
+        # bulk_update sends no signals; catalog pages and suggestions show prices too
+        caching.bump_version(caching.CATALOG_VERSION)
+        suggestions.invalidate()
+    return updated, skipped
@@ -0,0 +1,94 @@
+"""Full-text product search backed by the SQLite FTS5 index.
+
+Other database backends fall back to the original icontains filters.
+"""
+import re
+
+from django.db import connections
+from django.db.models import F, FloatField, Q, Value
+
+from .models import Product, ProductSearchIndex
+
+SEARCH_TABLE = ProductSearchIndex._meta.db_table
+
+# Fields that feed the index; saves touching none of them skip reindexing
+INDEXED_FIELDS = {'name', 'composition', 'description', 'category', 'manufacturer'}
+
+# bm25 column weights: name, composition, description, manufacturer, category
+RANK_WEIGHTS = (10.0, 5.0, 1.0, 4.0, 2.0)
+
+
+def is_enabled(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def build_match_query(query):
+    """Turn free text into an FTS5 query: every word as a quoted prefix term"""
+    terms = re.findall(r'\w+', query)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search_products(queryset, query):
+    """Filter `queryset` to products matching `query`, annotated with `search_rank`
+    
+    Lower `search_rank` is a better match, so order ascending.
+    """
+    match = build_match_query(query)
+    if not match:
+        return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+    
+    if is_enabled(queryset.db):
+        return queryset.filter(search_index__document__match=match).annotate(
+            search_rank=F('search_index__rank')
+        )
+    
+    return queryset.filter(
+        Q(name__icontains=query) |
+        Q(composition__icontains=query) |
+        Q(description__icontains=query) |
+        Q(manufacturer__name__icontains=query) |
+        Q(category__name__icontains=query)
+    ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def _product_ids_sql(using, filters):
+    return Product.objects.using(using).filter(**filters).values('id').query.sql_with_params()
+
+
+def reindex_products(using='default', **filters):
+    """Rewrite the index rows for products matching `filters` (all if none)"""
+    if not is_enabled(using):
+        return
+    
+    select = f"""
+        SELECT p.id, p.name, p.composition, p.description, m.name, c.name
+        FROM {Product._meta.db_table} p
+        INNER JOIN products_manufacturer m ON m.id = p.manufacturer_id
+        INNER JOIN products_category c ON c.id = p.category_id
+    """
+    columns = 'rowid, name, composition, description, manufacturer, category'
+    
+    with connections[using].cursor() as cursor:
+        if filters:
+            ids_sql, params = _product_ids_sql(using, filters)
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({ids_sql})", params)
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} ({columns}) {select} WHERE p.id IN ({ids_sql})",
+                params
+            )
+        else:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+            cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({columns}) {select}")
+            weights = ', '.join(str(weight) for weight in RANK_WEIGHTS)
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rank) VALUES ('rank', %s)",
+                [f"bm25({weights})"]
+            )
+
+
+def remove_products(product_ids, using='default'):
+    if not is_enabled(using) or not product_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})", list(product_ids))
@@ -0,0 +1,123 @@
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import caching, search, suggestions
+from .models import Category, Manufacturer, Product, ProductImage, ProductReview, Stock, StockLot, StockSnapshot
+
+
+@receiver(post_delete, sender=Product)
+def release_product_counters(sender, instance, **kwargs):
+    """Keep stored counters right for deletes, including cascades"""
+    if instance.is_active:
+        Category.adjust_product_count(instance.category_id, -1)
+        Manufacturer.adjust_product_count(instance.manufacturer_id, -1)
+
+
+@receiver(post_save, sender=ProductReview)
+@receiver(post_delete, sender=ProductReview)
+def refresh_product_rating(sender, instance, **kwargs):
+    """Recompute the product's stored rating after any review change"""
+    product = Product.objects.filter(pk=instance.product_id).first()
+    if product:
+        product.refresh_rating()
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or search.INDEXED_FIELDS & set(update_fields):
+        search.reindex_products(pk=instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Manufacturer)
+@receiver(post_save, sender=Category)
+def reindex_renamed(sender, instance, created, update_fields=None, **kwargs):
+    """Category and manufacturer names are denormalized into the index"""
+    if created or (update_fields is not None and 'name' not in update_fields):
+        return
+    field = 'manufacturer' if sender is Manufacturer else 'category'
+    search.reindex_products(**{field: instance})
+
+
+SUGGESTION_FIELDS = {
+    'name', 'slug', 'patient_price', 'pharmacy_price', 'is_active', 'category', 'manufacturer'
+}
+
+
+@receiver(post_save, sender=Product)
+def invalidate_product_suggestions(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or SUGGESTION_FIELDS & set(update_fields):
+        suggestions.invalidate()
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Manufacturer)
+@receiver(post_delete, sender=Manufacturer)
+def invalidate_suggestions(sender, **kwargs):
+    suggestions.invalidate()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Stock)
+@receiver(post_delete, sender=Stock)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Manufacturer)
+@receiver(post_delete, sender=Manufacturer)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductReview)
+@receiver(post_delete, sender=ProductReview)
+def invalidate_catalog(sender, **kwargs):
+    """Any product (including stock, images and reviews), category or
+    manufacturer change retires every cached catalog result set, and the
+    related-products block on detail pages, whose cards show them"""
+    caching.bump_version(caching.CATALOG_VERSION)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def touch_product_for_image(sender, instance, **kwargs):
+    """Image changes move the product's updated_at, and so its card_version"""
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Manufacturer)
+@receiver(post_save, sender=Category)
+def touch_products_for_rename(sender, instance, created, update_fields=None, **kwargs):
+    """Cached product cards and detail pages show these names"""
+    if created or (update_fields is not None and 'name' not in update_fields):
+        return
+    Product.objects.filter(**{sender._meta.model_name: instance}).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=ProductImage)
+def render_image_derivatives(sender, instance, **kwargs):
+    """New or replaced originals get their card/detail/zoom sizes rendered"""
+    if instance.image and not instance.derivatives:
+        instance.schedule_derivatives()
+
+
+@receiver(post_delete, sender=Stock)
+def reverse_stock_movement(sender, instance, **kwargs):
+    """Take a deleted movement back out of the stock balance; snapshots
+    that included it no longer describe the ledger"""
+    # Clamped: stock already sold from a deleted receipt cannot go negative
+    Product.objects.filter(pk=instance.product_id).update(
+        stock_quantity=Greatest(F('stock_quantity') - instance.quantity, Value(0))
+    )
+    if instance.lot_id:
+        StockLot.objects.filter(pk=instance.lot_id).update(
+            quantity=Greatest(F('quantity') - instance.quantity, Value(0)), updated_at=timezone.now()
+        )
+    StockSnapshot.objects.filter(product_id=instance.product_id, last_movement__gte=instance.pk).delete()
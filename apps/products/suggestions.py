@@ -0,0 +1,154 @@
+"""In-process prefix index for search-as-you-type suggestions.
+
+Every word of every active product, category and manufacturer name is
+kept in one sorted list, so a lookup is a bisect plus a short scan.
+The index is rebuilt lazily once the shared 'suggestions' version has
+been bumped by a catalog change. Changes made in this process show up
+at once; the version is otherwise re-read at most every
+SUGGESTIONS_VERSION_CHECK_INTERVAL seconds, so most keystrokes touch no
+database and changes from other processes show up within that interval.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.urls import reverse
+
+from . import caching
+from .models import Category, Manufacturer, Product
+
+VERSION_NAME = 'suggestions'
+
+# How many suggestions of each kind a lookup returns
+LIMITS = {'product': 5, 'category': 3, 'manufacturer': 3}
+
+# Candidates gathered per kind before ranking, so short prefixes stay cheap
+SCAN_LIMIT = 50
+
+
+def normalize(text):
+    return ' '.join(re.findall(r'\w+', text.lower()))
+
+
+class SuggestionIndex:
+    def __init__(self, check_interval=0):
+        self.check_interval = check_interval
+        self.checked_at = None  # monotonic time of the last version read
+        self.version = None
+        self.tokens = []   # sorted (token, kind, id)
+        self.entries = {}  # (kind, id) -> entry dict
+        self.lock = threading.Lock()
+    
+    def build(self):
+        entries = {}
+        for pk, name, slug, patient_price, pharmacy_price, manufacturer in (
+            Product.objects.filter(is_active=True).values_list(
+                'id', 'name', 'slug', 'patient_price', 'pharmacy_price', 'manufacturer__name'
+            )
+        ):
+            entries[('product', pk)] = {
+                'name': name,
+                'slug': slug,
+                'manufacturer': manufacturer,
+                'patient_price': float(patient_price),
+                'pharmacy_price': float(pharmacy_price),
+            }
+        for pk, name, slug, product_count in (
+            Category.objects.filter(is_active=True).values_list('id', 'name', 'slug', 'product_count')
+        ):
+            entries[('category', pk)] = {'name': name, 'slug': slug, 'product_count': product_count}
+        for pk, name, slug, product_count in (
+            Manufacturer.objects.filter(is_active=True).values_list('id', 'name', 'slug', 'product_count')
+        ):
+            entries[('manufacturer', pk)] = {'name': name, 'slug': slug, 'product_count': product_count}
+        
+        tokens = []
+        for (kind, pk), entry in entries.items():
+            entry['normalized'] = normalize(entry['name'])
+            for token in set(entry['normalized'].split()):
+                tokens.append((token, kind, pk))
+        tokens.sort()
+        
+        self.tokens, self.entries = tokens, entries
+    
+    def ensure_current(self):
+        now = time.monotonic()
+        if self.checked_at is not None and now - self.checked_at < self.check_interval:
+            return
+        version = caching.get_version(VERSION_NAME)
+        self.checked_at = now
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.build()
+                    self.version = version
+    
+    def lookup(self, query):
+        """Entries whose words start with every word of `query`, by kind"""
+        words = normalize(query).split()
+        if not words:
+            return {kind: [] for kind in LIMITS}
+        probe = max(words, key=len)
+        
+        candidates = {kind: [] for kind in LIMITS}
+        seen = set()
+        tokens = self.tokens
+        i = bisect_left(tokens, (probe,))
+        while i < len(tokens) and tokens[i][0].startswith(probe):
+            _, kind, pk = tokens[i]
+            i += 1
+            if (kind, pk) in seen or len(candidates[kind]) >= SCAN_LIMIT:
+                continue
+            seen.add((kind, pk))
+            entry = self.entries[(kind, pk)]
+            entry_words = entry['normalized'].split()
+            if all(any(w.startswith(word) for w in entry_words) for word in words):
+                candidates[kind].append(entry)
+        
+        phrase = ' '.join(words)
+        return {
+            kind: sorted(found, key=lambda e: (not e['normalized'].startswith(phrase), e['name']))[:LIMITS[kind]]
+            for kind, found in candidates.items()
+        }
+
+
+index = SuggestionIndex(check_interval=settings.SUGGESTIONS_VERSION_CHECK_INTERVAL)
+
+
+def invalidate():
+    caching.bump_version(VERSION_NAME)
+    # Re-read on the next lookup rather than after the interval
+    index.checked_at = None
+
+
+def get_suggestions(query, user):
+    index.ensure_current()
+    found = index.lookup(query)
+    is_pharmacy = bool(user and user.is_authenticated and user.user_type == 'PHARMACY')
+    
+    suggestions = []
+    for entry in found['product']:
+        suggestions.append({
+            'type': 'product',
+            'name': entry['name'],
+            'url': reverse('products:product_detail', kwargs={'slug': entry['slug']}),
+            'manufacturer': entry['manufacturer'],
+            'price': entry['pharmacy_price'] if is_pharmacy else entry['patient_price'],
+        })
+    for entry in found['category']:
+        suggestions.append({
+            'type': 'category',
+            'name': entry['name'],
+            'url': reverse('products:category_products', kwargs={'slug': entry['slug']}),
+            'product_count': entry['product_count'],
+        })
+    for entry in found['manufacturer']:
+        suggestions.append({
+            'type': 'manufacturer',
+            'name': entry['name'],
+            'url': reverse('products:manufacturer_products', kwargs={'slug': entry['slug']}),
+            'product_count': entry['product_count'],
+        })
+    return suggestions
@@ -0,0 +1,11 @@
+from django import template
+
+register = template.Library()
+
+
+@register.filter
+def price_tier(user):
+    """Which variant of price-dependent markup a user sees"""
+    if user and user.is_authenticated:
+        return user.user_type
+    return 'ANONYMOUS'
@@ -1,3 +1,160 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from .inventory import InsufficientStock, allocate_stock, available_quantity, hold_stock, stock_transaction
+from .models import Category, Manufacturer, Product, Stock, StockLot
+from .pricing import apply_price_revision, plan_price_revision, revised_price, round_price
+
+
+def make_product(stock, name='Paracetamol 500mg'):
+    return Product.objects.create(
+        name=name,
+        category=Category.objects.get_or_create(name='Tablets')[0],
+        manufacturer=Manufacturer.objects.get_or_create(name='Cipla Ltd')[0],
+        description='Pain relief',
+        mrp_price=Decimal('20.00'),
+        patient_price=Decimal('18.00'),
+        pharmacy_price=Decimal('15.00'),
+        stock_quantity=stock,
+    )
+
+
+class PriceRevisionTests(SimpleTestCase):
+    def test_half_cent_rounds_up_exactly(self):
+        # 999.90 * 1.05 = 1049.895; float arithmetic lands just below the half cent
+        self.assertEqual(revised_price(Decimal('999.90'), percent=5), Decimal('1049.90'))
+
+    def test_every_price_matches_decimal_arithmetic(self):
+        for cents in range(100, 100000):
+            price = Decimal(cents) / 100
+            expected = (price * Decimal('1.05')).quantize(Decimal('0.01'), rounding='ROUND_HALF_UP')
+            self.assertEqual(revised_price(price, percent=5), expected, price)
+
+    def test_cap_at_mrp_and_floor(self):
+        self.assertEqual(revised_price(Decimal('95.00'), mrp=Decimal('99.99'), percent=10), Decimal('99.99'))
+        self.assertEqual(revised_price(Decimal('5.00'), amount=-10), Decimal('0.00'))
+
+    def test_round_to_step(self):
+        self.assertEqual(round_price(Decimal('10.25'), Decimal('0.50')), Decimal('10.50'))
+        self.assertEqual(round_price(Decimal('10.24'), Decimal('0.50')), Decimal('10.00'))
+
+
+class ApplyPriceRevisionTests(TestCase):
+    def test_prices_edited_after_planning_are_kept(self):
+        kept = make_product(10)
+        edited = make_product(10, name='Ibuprofen 400mg')
+        changes = list(plan_price_revision(Product.objects.all(), 'patient_price', percent=10))
+        Product.objects.filter(pk=edited.pk).update(patient_price=Decimal('17.50'))
+
+        updated, skipped = apply_price_revision(changes, 'patient_price')
+        self.assertEqual(updated, 1)
+        self.assertEqual([change[0] for change in skipped], [edited.pk])
+        kept.refresh_from_db()
+        edited.refresh_from_db()
+        self.assertEqual(kept.patient_price, Decimal('19.80'))
+        self.assertEqual(edited.patient_price, Decimal('17.50'))
+
+
+class SellableStockTests(TestCase):
+    def setUp(self):
+        self.product = make_product(20)
+        StockLot.objects.create(
+            product=self.product, batch_number='OLD', quantity=5,
+            expiry_date=timezone.localdate() - timedelta(days=3),
+        )
+
+    def test_expired_lots_are_not_available(self):
+        self.assertEqual(available_quantity(self.product), 15)
+
+    def test_hold_survives_allocation_of_the_rest(self):
+        self.assertEqual(hold_stock([(self.product, 10)], 'cart:1'), [])
+        with self.assertRaises(InsufficientStock) as raised:
+            with transaction.atomic():
+                allocate_stock([(self.product, 10)], hold_key='cart:2')
+        self.assertEqual(raised.exception.shortages, [(self.product, 10, 5)])
+
+        with transaction.atomic():
+            allocate_stock([(self.product, 10)], hold_key='cart:1')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 10)
+        self.assertEqual(available_quantity(self.product), 5)
+
+    def test_lots_above_stock_are_capped(self):
+        product = make_product(5, name='Ibuprofen 400mg')
+        StockLot.objects.create(product=product, batch_number='B1', quantity=15)
+        self.assertEqual(available_quantity(product), 5)
+        with self.assertRaises(InsufficientStock) as raised:
+            with transaction.atomic():
+                allocate_stock([(product, 12)])
+        self.assertEqual(raised.exception.shortages, [(product, 12, 5)])
+
+
+class StockLedgerTests(TestCase):
+    def setUp(self):
+        self.product = make_product(0)
+        Stock.objects.create(product=self.product, movement_type='IN', quantity=15, batch_number='B1')
+
+    def lot_total(self):
+        return sum(self.product.lots.values_list('quantity', flat=True))
+
+    def test_unlotted_stock_out_trims_lots(self):
+        Stock.objects.create(product=self.product, movement_type='OUT', quantity=-10)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 5)
+        self.assertEqual(self.lot_total(), 5)
+
+    def test_editing_a_checkpointed_movement_keeps_the_ledger(self):
+        movement = Stock.objects.create(product=self.product, movement_type='IN', quantity=5)
+        call_command('reconcile_stock', '--checkpoint', stdout=StringIO())
+        movement.quantity = 8
+        movement.save()
+
+        call_command('reconcile_stock', '--fix', 'ledger', stdout=StringIO())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 23)
+        self.assertFalse(self.product.stock_snapshots.filter(last_movement__gte=movement.pk).exists())
+
+
+class ConcurrentAllocationTests(TransactionTestCase):
+    STOCK = 50
+    CHECKOUTS = 12
+    QUANTITY = 7
+
+    def test_concurrent_checkouts_never_oversell(self):
+        product = make_product(self.STOCK)
+        sold = []
+        errors = []
+        start = threading.Barrier(self.CHECKOUTS)
+
+        def checkout():
+            try:
+                start.wait()
+                with stock_transaction():
+                    allocate_stock([(Product.objects.get(pk=product.pk), self.QUANTITY)])
+                sold.append(self.QUANTITY)
+            except InsufficientStock:
+                pass
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=checkout) for _ in range(self.CHECKOUTS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertLessEqual(sum(sold), self.STOCK)
+        product.refresh_from_db()
+        self.assertGreaterEqual(product.stock_quantity, 0)
+        self.assertEqual(product.stock_quantity, self.STOCK - sum(sold))
+        self.assertEqual(len(sold), self.STOCK // self.QUANTITY)
@@ -16,7 +16,12 @@ urlpatterns = [
     path('product/<slug:slug>/', views.ProductDetailView.as_view(), name='product_detail'),
     path('product/<slug:slug>/review/', views.ProductReviewCreateView.as_view(), name='add_review'),
     
+    # Content-addressed product images
+    path('images/<str:filename>', views.product_image, name='image'),
+    
     # AJAX endpoints
+    path('api/products/', views.ProductCatalogJSONView.as_view(), name='catalog_json'),
+    path('api/quick-view/', views.product_quick_views, name='product_quick_views'),
     path('api/quick-view/<int:product_id>/', views.product_quick_view, name='product_quick_view'),
     path('api/search-suggestions/', views.search_suggestions, name='search_suggestions'),
 ]
@@ -3,15 +3,32 @@ from django.views.generic import ListView, DetailView, CreateView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, Avg, Count, F
-from django.http import JsonResponse
+from django.db.models import Avg, Count, TextField, Value
+from django.db.models.functions import Coalesce, NullIf, Substr
+from django.http import FileResponse, Http404, JsonResponse
 from django.core.paginator import Paginator
+from django.core.cache import cache
+from django.conf import settings
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from django.core.files.storage import default_storage
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
+from decimal import Decimal
+import hashlib
 
 from .models import Product, Category, Manufacturer, ProductReview, Stock
 from .forms import ProductSearchForm, ProductReviewForm, ProductFilterForm
+from . import caching, images
+from .counters import view_counts
+from .facets import compute_facets
+from .inventory import available_quantity
+from .pagination import KeysetPaginationMixin
+from .search import search_products
+from .suggestions import get_suggestions
+from .templatetags.product_tags import price_tier
 
-class ProductCatalogView(ListView):
+class ProductCatalogView(KeysetPaginationMixin, ListView):
     """Product catalog with search and filtering"""
     model = Product
     template_name = 'products/catalog.html'
@@ -19,27 +36,23 @@ class ProductCatalogView(ListView):
     paginate_by = 12
     
     def get_queryset(self):
-        queryset = Product.objects.filter(is_active=True).select_related(
-            'category', 'manufacturer'
-        ).prefetch_related('images', 'reviews')
+        # Pharmacy users filter and sort on the price they actually pay
+        self.price_field = Product.price_field_for_user(self.request.user)
+        queryset = Product.objects.filter(is_active=True).for_listing().with_user_pricing(self.request.user)
         
         # Search functionality
         query = self.request.GET.get('query')
         if query:
-            queryset = queryset.filter(
-                Q(name__icontains=query) |
-                Q(description__icontains=query) |
-                Q(manufacturer__name__icontains=query) |
-                Q(category__name__icontains=query)
-            )
+            queryset = search_products(queryset, query)
         
         # Category filtering
+        self.category = None
         category_slug = self.request.GET.get('category')
         if category_slug:
             try:
-                category = Category.objects.get(slug=category_slug)
+                category = self.category = Category.objects.get(slug=category_slug)
                 # Include products from subcategories
-                categories = [category] + category.get_all_children
+                categories = category.get_descendants(include_self=True)
                 queryset = queryset.filter(category__in=categories)
             except Category.DoesNotExist:
                 pass
@@ -53,9 +66,9 @@ class ProductCatalogView(ListView):
         min_price = self.request.GET.get('min_price')
         max_price = self.request.GET.get('max_price')
         if min_price:
-            queryset = queryset.filter(patient_price__gte=min_price)
+            queryset = queryset.filter(**{f'{self.price_field}__gte': min_price})
         if max_price:
-            queryset = queryset.filter(patient_price__lte=max_price)
+            queryset = queryset.filter(**{f'{self.price_field}__lte': max_price})
         
         # Prescription filtering
         prescription_required = self.request.GET.get('prescription_required')
@@ -67,10 +80,13 @@ class ProductCatalogView(ListView):
         if in_stock:
             queryset = queryset.filter(stock_quantity__gt=0)
         
-        # Sorting
-        sort = self.request.GET.get('sort', '-created_at')
-        if sort:
-            queryset = queryset.order_by(sort)
+        # Sorting (best match first when searching, unless asked otherwise)
+        sort = self.request.GET.get('sort', 'relevance')
+        if sort == 'relevance':
+            if query:
+                queryset = queryset.order_by('search_rank', '-created_at')
+        elif sort in dict(ProductFilterForm.SORT_CHOICES):
+            queryset = queryset.order_by(sort.replace('patient_price', self.price_field))
         
         return queryset
     
@@ -80,15 +96,86 @@ class ProductCatalogView(ListView):
         context['filter_form'] = ProductFilterForm(self.request.GET)
         context['categories'] = Category.objects.filter(is_active=True, parent=None)
         context['manufacturers'] = Manufacturer.objects.filter(is_active=True)[:10]
-        context['total_products'] = self.get_queryset().count()
-        
-        # Add user-specific pricing
-        for product in context['products']:
-            product.user_price = product.get_price_for_user(self.request.user)
-            product.discount_percentage = product.get_discount_percentage(self.request.user)
-        
+        context['total_products'], context['total_is_exact'] = self.get_result_count(context)
+        context['facets'] = self.get_facets()
+        context['card_cache_timeout'] = settings.PRODUCT_CARD_CACHE_TIMEOUT
         return context
 
+    def get_filter_signature(self):
+        return caching.filter_signature(self.request.GET, self.price_field)
+    
+    def paginate_queryset(self, queryset, page_size):
+        if not self.is_cursor_mode():
+            # Ordered ids and the total for this filter combination come from the cache
+            queryset = caching.cached_catalog_results(queryset, self.get_filter_signature())
+        return super().paginate_queryset(queryset, page_size)
+    
+    def get_facets(self):
+        """Facet counts for the current result set, with a filter URL per value"""
+        key = caching.catalog_key('facets', self.get_filter_signature())
+        facets = cache.get(key)
+        if facets is None:
+            facets = compute_facets(self.object_list, parent=self.category, price_field=self.price_field)
+            cache.set(key, facets, caching.catalog_timeout())
+        for facet in facets['categories']:
+            facet['url'] = self.filter_url(category=facet['value'])
+        for facet in facets['manufacturers']:
+            facet['url'] = self.filter_url(manufacturer=facet['value'])
+        for facet in facets['prescription']:
+            facet['url'] = self.filter_url(prescription_required=facet['value'])
+        for facet in facets['price_ranges']:
+            high = facet['max']
+            # Buckets are half-open; prices have two decimal places
+            facet['url'] = self.filter_url(
+                min_price=facet['min'],
+                max_price=Decimal(high) - Decimal('0.01') if high is not None else None
+            )
+        facets['in_stock_url'] = self.filter_url(in_stock='on')
+        return facets
+    
+    def filter_url(self, **params):
+        """Current catalog URL with `params` replaced (None removes a param)"""
+        query = self.request.GET.copy()
+        query.pop('page', None)
+        for key, value in params.items():
+            query.pop(key, None)
+            if value is not None:
+                query[key] = value
+        return f"?{query.urlencode()}"
+
+class ProductCatalogJSONView(ProductCatalogView):
+    """Catalog listing as JSON for infinite scroll, always cursor-paginated"""
+    
+    def is_cursor_mode(self):
+        return True
+    
+    def get_context_data(self, **kwargs):
+        # Skip the sidebar forms and facets; only the page is needed
+        return ListView.get_context_data(self, **kwargs)
+    
+    def render_to_response(self, context, **response_kwargs):
+        user = self.request.user
+        page = context['page_obj']
+        return JsonResponse({
+            'products': [
+                {
+                    'id': product.id,
+                    'name': product.name,
+                    'slug': product.slug,
+                    'url': product.get_absolute_url(),
+                    'manufacturer': product.manufacturer.name,
+                    'category': product.category.name,
+                    'mrp_price': float(product.mrp_price),
+                    'user_price': float(product.user_price),
+                    'discount_percentage': product.discount_percentage,
+                    'prescription_required': product.prescription_required,
+                    'in_stock': product.is_in_stock,
+                }
+                for product in page.object_list
+            ],
+            'next_cursor': page.next_cursor,
+        })
+
 class ProductDetailView(DetailView):
     """Product detail view"""
     model = Product
@@ -99,14 +186,20 @@ class ProductDetailView(DetailView):
     
     def get_object(self, queryset=None):
         product = super().get_object(queryset)
-        # Increment view count
-        Product.objects.filter(id=product.id).update(view_count=F('view_count') + 1)
+        # Counted in memory and written in batches
+        view_counts.add(product.id)
         return product
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         product = context['product']
         
+        # The page body is cached per product version and price tier (see the
+        # template); queries below are lazy so a cache hit never runs them
+        context['detail_cache_timeout'] = settings.PRODUCT_DETAIL_CACHE_TIMEOUT
+        context['card_cache_timeout'] = settings.PRODUCT_CARD_CACHE_TIMEOUT
+        context['catalog_version'] = caching.get_version(caching.CATALOG_VERSION)
+        
         # User-specific pricing
         context['user_price'] = product.get_price_for_user(self.request.user)
         context['discount_percentage'] = product.get_discount_percentage(self.request.user)
@@ -116,25 +209,47 @@ class ProductDetailView(DetailView):
         context['reviews'] = reviews
         context['user_review'] = None
         
-        if self.request.user.is_authenticated:
+        # Per-user piece, rendered outside the cached fragments
+        if self.request.user.is_authenticated and product.review_count:
             context['user_review'] = reviews.filter(user=self.request.user).first()
         
-        # Related products
-        context['related_products'] = Product.objects.filter(
-            category=product.category,
-            is_active=True
-        ).exclude(id=product.id)[:4]
+        # Evaluated only when the related block is not cached
+        context['related_products'] = SimpleLazyObject(self.get_related_products)
         
-        # Stock status
-        context['stock_status'] = {
-            'in_stock': product.is_in_stock,
-            'low_stock': product.is_low_stock,
-            'quantity': product.stock_quantity if product.track_inventory else None
-        }
+        # Stock status: sellable (unexpired) stock net of holds for checkouts in progress;
+        # part of the page cache key, so holds show without a product change
+        if product.track_inventory:
+            available = available_quantity(product)
+            context['stock_status'] = {
+                'in_stock': available > 0,
+                'low_stock': available <= product.low_stock_threshold,
+                'quantity': available
+            }
+        else:
+            context['stock_status'] = {'in_stock': True, 'low_stock': False, 'quantity': None}
         
         return context
+    
+    def get_related_products(self):
+        """Frequently bought together (precomputed), topped up from the same
+        category for products without order history"""
+        product = self.object
+        related = list(
+            Product.objects.filter(
+                affinity_targets__product=product,
+                is_active=True
+            ).for_listing().with_user_pricing(self.request.user).order_by('affinity_targets__rank')[:4]
+        )
+        if len(related) < 4:
+            related += Product.objects.filter(
+                category=product.category,
+                is_active=True
+            ).exclude(
+                id__in=[product.id] + [p.id for p in related]
+            ).for_listing().with_user_pricing(self.request.user)[:4 - len(related)]
+        return related
 
-class CategoryProductsView(ListView):
+class CategoryProductsView(KeysetPaginationMixin, ListView):
     """Products by category"""
     model = Product
     template_name = 'products/category_products.html'
@@ -144,11 +259,11 @@ class CategoryProductsView(ListView):
     def get_queryset(self):
         self.category = get_object_or_404(Category, slug=self.kwargs['slug'], is_active=True)
         # Include products from subcategories
-        categories = [self.category] + self.category.get_all_children
+        categories = self.category.get_descendants(include_self=True)
         return Product.objects.filter(
             category__in=categories,
             is_active=True
-        ).select_related('category', 'manufacturer').prefetch_related('images')
+        ).for_listing().with_user_pricing(self.request.user)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -156,7 +271,7 @@ class CategoryProductsView(ListView):
         context['subcategories'] = self.category.children.filter(is_active=True)
         return context
 
-class ManufacturerProductsView(ListView):
+class ManufacturerProductsView(KeysetPaginationMixin, ListView):
     """Products by manufacturer"""
     model = Product
     template_name = 'products/manufacturer_products.html'
@@ -168,14 +283,14 @@ class ManufacturerProductsView(ListView):
         return Product.objects.filter(
             manufacturer=self.manufacturer,
             is_active=True
-        ).select_related('category', 'manufacturer').prefetch_related('images')
+        ).for_listing().with_user_pricing(self.request.user)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['manufacturer'] = self.manufacturer
         return context
 
-class ProductSearchView(ListView):
+class ProductSearchView(KeysetPaginationMixin, ListView):
     """Product search results"""
     model = Product
     template_name = 'products/search_results.html'
@@ -187,18 +302,13 @@ class ProductSearchView(ListView):
         if not query:
             return Product.objects.none()
         
-        return Product.objects.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(manufacturer__name__icontains=query) |
-            Q(category__name__icontains=query),
-            is_active=True
-        ).select_related('category', 'manufacturer').prefetch_related('images')
+        queryset = Product.objects.filter(is_active=True).for_listing().with_user_pricing(self.request.user)
+        return search_products(queryset, query).order_by('search_rank', '-created_at')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['query'] = self.request.GET.get('q', '')
-        context['total_results'] = self.get_queryset().count()
+        context['total_results'], context['total_is_exact'] = self.get_result_count(context)
         return context
 
 class ProductReviewCreateView(LoginRequiredMixin, CreateView):
@@ -233,38 +343,82 @@ class ProductReviewCreateView(LoginRequiredMixin, CreateView):
         return context
 
 # AJAX Views
+MAX_QUICK_VIEW_BATCH = 48
+
+def _quick_view_queryset(request):
+    """Listing-sized rows plus a SQL-side summary, so descriptions stay in the database"""
+    return Product.objects.filter(is_active=True).for_listing().with_user_pricing(
+        request.user
+    ).annotate(
+        summary=Coalesce(
+            NullIf('short_description', Value('')),
+            Substr('description', 1, 200),
+            output_field=TextField()
+        )
+    )
+
+def _quick_view_record(product):
+    image = product.primary_image
+    return {
+        'id': product.id,
+        'version': product.card_version,
+        'name': product.name,
+        'slug': product.slug,
+        'manufacturer': product.manufacturer.name,
+        'category': product.category.name,
+        'description': product.summary,
+        'mrp_price': float(product.mrp_price),
+        'user_price': float(product.user_price),
+        'discount_percentage': product.discount_percentage,
+        'prescription_required': product.prescription_required,
+        'in_stock': product.is_in_stock,
+        'stock_quantity': product.stock_quantity if product.track_inventory else None,
+        # URLs only: rows still holding base64 are left out rather than inlined
+        'image': image.variants['card'] if image and image.image else None,
+        'url': product.get_absolute_url(),
+    }
+
+def _quick_view_ids(request):
+    try:
+        ids = [int(value) for value in request.GET.get('ids', '').split(',') if value]
+    except ValueError:
+        return None
+    return ids[:MAX_QUICK_VIEW_BATCH]
+
+def _quick_views_etag(request):
+    """Versions of the requested products, for the viewer's price tier"""
+    ids = _quick_view_ids(request)
+    if not ids:
+        return None
+    versions = Product.objects.filter(is_active=True, id__in=ids).order_by('id').values_list(
+        'id', 'updated_at', 'stock_quantity', 'rating_count', 'rating_avg'
+    )
+    tier = price_tier(request.user)
+    return hashlib.sha1(f"{tier}:{list(versions)}".encode()).hexdigest()
+
 def product_quick_view(request, product_id):
     """AJAX view for product quick view modal"""
     if request.method == 'GET':
         try:
-            product = Product.objects.select_related('category', 'manufacturer').get(
-                id=product_id, is_active=True
-            )
-            user_price = product.get_price_for_user(request.user)
-            discount_percentage = product.get_discount_percentage(request.user)
-            
-            data = {
-                'id': product.id,
-                'name': product.name,
-                'slug': product.slug,
-                'manufacturer': product.manufacturer.name,
-                'category': product.category.name,
-                'description': product.short_description or product.description[:200],
-                'mrp_price': float(product.mrp_price),
-                'user_price': float(user_price),
-                'discount_percentage': discount_percentage,
-                'prescription_required': product.prescription_required,
-                'in_stock': product.is_in_stock,
-                'stock_quantity': product.stock_quantity if product.track_inventory else None,
-                'primary_image': product.primary_image.image_data if product.primary_image else None,
-                'url': product.get_absolute_url(),
-            }
-            return JsonResponse(data)
+            product = _quick_view_queryset(request).get(id=product_id)
+            return JsonResponse(_quick_view_record(product))
         except Product.DoesNotExist:
             return JsonResponse({'error': 'Product not found'}, status=404)
     
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
+@require_GET
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_quick_views_etag)
+def product_quick_views(request):
+    """Quick-view records for a whole grid (?ids=1,2,3) in one round trip;
+    revalidations are answered with 304 while no product has changed"""
+    ids = _quick_view_ids(request)
+    if ids is None:
+        return JsonResponse({'error': 'Invalid product ids'}, status=400)
+    products = _quick_view_queryset(request).filter(id__in=ids)
+    return JsonResponse({'products': [_quick_view_record(product) for product in products]})
+
 def search_suggestions(request):
     """AJAX view for search suggestions"""
     if request.method == 'GET':
@@ -272,39 +426,27 @@ def search_suggestions(request):
         if len(query) < 2:
             return JsonResponse({'suggestions': []})
         
-        # Get product suggestions
-        products = Product.objects.filter(
-            name__icontains=query,
-            is_active=True
-        )[:5]
-        
-        # Get category suggestions
-        categories = Category.objects.filter(
-            name__icontains=query,
-            is_active=True
-        )[:3]
-        
-        suggestions = []
-        
-        # Add product suggestions
-        for product in products:
-            suggestions.append({
-                'type': 'product',
-                'name': product.name,
-                'url': product.get_absolute_url(),
-                'manufacturer': product.manufacturer.name,
-                'price': float(product.get_price_for_user(request.user)),
-            })
-        
-        # Add category suggestions
-        for category in categories:
-            suggestions.append({
-                'type': 'category',
-                'name': category.name,
-                'url': category.get_absolute_url(),
-                'product_count': category.product_count,
-            })
-        
-        return JsonResponse({'suggestions': suggestions})
+        # Served from the in-process prefix index; the database is read only
+        # to recheck the index version every few seconds, or to rebuild it
+        return JsonResponse({'suggestions': get_suggestions(query, request.user)})
     
     return JsonResponse({'error': 'Invalid request'}, status=400)
+
+def _image_etag(request, filename):
+    match = images.NAME_RE.match(filename)
+    return match.group('digest') if match else None
+
+@require_GET
+@cache_control(public=True, max_age=31536000, immutable=True)
+@condition(etag_func=_image_etag)
+def product_image(request, filename):
+    """Serve a content-addressed product image; names never change meaning,
+    so revalidations are answered with 304 before touching storage"""
+    match = images.NAME_RE.match(filename)
+    if not match:
+        raise Http404
+    try:
+        handle = default_storage.open(images.storage_name(filename))
+    except FileNotFoundError:
+        raise Http404
+    return FileResponse(handle, content_type=images.CONTENT_TYPES[match.group('ext')])
@@ -94,6 +94,13 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # How long a writer waits for the lock; checkouts take it up front
+            # (see apps.products.inventory.stock_transaction)
+            'timeout': 20,
+        },
+        # On disk rather than in memory, so tests can share it across threads
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -152,6 +159,23 @@ SITE_URL = 'http://127.0.0.1:8000'
 SESSION_COOKIE_AGE = 86400  # 24 hours
 SESSION_SAVE_EVERY_REQUEST = True
 
+# Catalog caching (filtered result sets, facets)
+CATALOG_CACHE_TIMEOUT = 300  # seconds
+CATALOG_CACHE_MAX_IDS = 1200  # ordered ids kept per filter combination
+PRODUCT_DETAIL_CACHE_TIMEOUT = 3600  # seconds; keys are versioned, so this only bounds memory
+PRODUCT_CARD_CACHE_TIMEOUT = 86400  # seconds; likewise versioned
+SUGGESTIONS_VERSION_CHECK_INTERVAL = 5  # seconds between reads of the suggestion index version
+
+# Product image derivatives (card/detail/zoom sizes) are rendered in a process pool
+IMAGE_DERIVATIVE_WORKERS = 2
+
+# Product view counts are buffered per process and written in batches
+VIEW_COUNT_FLUSH_INTERVAL = 30  # seconds
+VIEW_COUNT_FLUSH_SIZE = 200  # buffered hits
+
+# Stock held for a cart while its owner is on the checkout page
+STOCK_HOLD_TTL = 15 * 60  # seconds
+
 # Message Framework
 from django.contrib.messages import constants as messages
 MESSAGE_TAGS = {
@@ -14,6 +14,9 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Delivery zone checker
     initializeDeliveryChecker();
+    
+    // Quick-view data for every product card on the page
+    prefetchQuickViews();
 });
 
 function initializeComponents() {
@@ -102,8 +105,77 @@ function getToastColor(type) {
     return colors[type] || colors['info'];
 }
 
+// Quick-view records by product id, as last sent by the server
+const quickViewCache = new Map();
+
+function storeQuickViews(products) {
+    products.forEach(product => quickViewCache.set(product.id, product));
+}
+
+// One request for the whole grid; the server answers 304 while nothing
+// has changed, and the browser reuses its cached copy
+function prefetchQuickViews() {
+    const ids = [...new Set(
+        Array.from(document.querySelectorAll('[data-quick-view]'), el => el.dataset.quickView)
+    )];
+    if (!ids.length) return Promise.resolve();
+    
+    return fetch(`/products/api/quick-view/?ids=${ids.join(',')}`)
+        .then(response => response.json())
+        .then(data => storeQuickViews(data.products || []))
+        .catch(error => console.error('Quick view prefetch failed:', error));
+}
+
 // Quick view function for product cards
 function quickView(productId) {
-    console.log('Quick view for product:', productId);
-    // Implement modal functionality here
+    const cached = quickViewCache.get(productId);
+    const load = cached
+        ? Promise.resolve(cached)
+        : fetch(`/products/api/quick-view/?ids=${productId}`)
+            .then(response => response.json())
+            .then(data => {
+                storeQuickViews(data.products || []);
+                return quickViewCache.get(productId);
+            });
+    
+    return load
+        .then(product => {
+            if (product) showQuickView(product);
+            return product;
+        })
+        .catch(() => showToast('Could not load product details', 'error'));
+}
+
+function showQuickView(product) {
+    const modal = document.createElement('div');
+    modal.className = 'fixed inset-0 bg-black bg-opacity-50 flex items-center justify-center p-4 z-50';
+    modal.innerHTML = `
+        <div class="bg-white rounded-lg shadow-lg max-w-lg w-full overflow-hidden">
+            ${product.image ? `<img src="${escapeHtml(product.image.jpg)}" alt="${escapeHtml(product.name)}" class="w-full h-48 object-cover">` : ''}
+            <div class="p-6">
+                <div class="flex items-start justify-between mb-2">
+                    <h3 class="text-lg font-semibold text-gray-900">${escapeHtml(product.name)}</h3>
+                    <button data-close class="ml-4 text-gray-500 hover:text-gray-700">
+                        <i class="fas fa-times"></i>
+                    </button>
+                </div>
+                <p class="text-sm text-gray-600 mb-3">${escapeHtml(product.manufacturer)}</p>
+                <p class="text-sm text-gray-700 mb-4">${escapeHtml(product.description)}</p>
+                <div class="mb-4">
+                    <span class="text-lg font-bold text-blue-600">₹${product.user_price.toFixed(2)}</span>
+                    ${product.discount_percentage > 0 ? `<span class="text-sm text-gray-500 line-through ml-2">₹${product.mrp_price.toFixed(2)}</span>` : ''}
+                    <span class="ml-2 text-xs font-medium ${product.in_stock ? 'text-green-800' : 'text-red-800'}">
+                        ${product.in_stock ? 'In Stock' : 'Out of Stock'}
+                    </span>
+                </div>
+                <a href="${escapeHtml(product.url)}" class="block bg-blue-600 text-white py-2 px-3 rounded hover:bg-blue-700 text-sm text-center">
+                    View Details
+                </a>
+            </div>
+        </div>
+    `;
+    modal.addEventListener('click', event => {
+        if (event.target === modal || event.target.closest('[data-close]')) modal.remove();
+    });
+    document.body.appendChild(modal);
 }